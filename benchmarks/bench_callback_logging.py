@@ -0,0 +1,85 @@
+"""
+Throughput and latency of /resemble-callback, to compare logging setups.
+
+Run the API once per setup and point this at it, e.g.:
+    APP_INSIGHTS_CONNECTION_STRING= uvicorn main:app --port 8080
+    python benchmarks/bench_callback_logging.py --label console-only
+
+    APP_INSIGHTS_CONNECTION_STRING=InstrumentationKey=... uvicorn main:app --port 8080
+    python benchmarks/bench_callback_logging.py --label app-insights
+
+    LOG_SAMPLE_EVERY=callback_metrics=1 ... (log every metrics payload)
+
+The payload carries a full metrics dict but no UUID, so the handler logs it and
+acks without scheduling DB work; the numbers are request path plus logging.
+The App Insights export moves to the listener thread, so what remains of the gap
+to console-only is the exporter's CPU, visible when cores are scarce.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_read_endpoints import percentile  # noqa: E402
+
+PAYLOAD = {
+    "item": {
+        "uuid": None,
+        "metrics": {
+            "label": "real",
+            "score": [0.01] * 200,  # per-window scores, as Resemble sends them
+            "consistency": "0.98",
+            "aggregated_score": "0.02",
+            "image": None,
+        },
+    }
+}
+
+
+def post_callbacks(base_url, stop, latencies, errors):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = session.post(f"{base_url}/resemble-callback", json=PAYLOAD, timeout=60)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8080")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--label", default="")
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=post_callbacks, args=(args.base_url, stop, latencies, errors), daemon=True)
+        for _ in range(args.threads)
+    ]
+    for t in threads:
+        t.start()
+
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=60)
+
+    print(
+        f"{args.label or args.base_url}: {len(latencies)} callbacks "
+        f"({len(latencies) / args.duration:.1f} req/s, {len(errors)} errors) "
+        f"p50={percentile(latencies, 50) * 1000:.1f} ms "
+        f"p99={percentile(latencies, 99) * 1000:.1f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Chunked transcription against a deterministic fake transcriber (no Azure calls).
+
+    python benchmarks/bench_chunked_transcription.py --minutes 20 --chunks 1 2 4 8
+
+The synthetic recording alternates two "voices" (a low and a high harmonic tone)
+every 5 s. The fake transcriber emits one utterance per 5 s window, taking
+--rtf seconds per second of audio, and names speakers differently in every chunk
+so the cross-chunk stitching has to recover consistent IDs. For each chunk count
+it prints wall-clock time and whether stitched speaker IDs match the ground truth.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import azure.cognitiveservices.speech as speechsdk  # noqa: E402
+
+from service.chunked_transcription import transcribe_in_chunks  # noqa: E402
+from service.speech_service import run_transcription_async  # noqa: E402
+
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 5
+VOICES = {"A": 140.0, "B": 310.0}
+
+
+def synth_recording(minutes, seed=0):
+    rng = np.random.default_rng(seed)
+    n_windows = int(minutes * 60 / WINDOW_SECONDS)
+    t = np.arange(WINDOW_SECONDS * SAMPLE_RATE) / SAMPLE_RATE
+    pieces, truth = [], []
+    for i in range(n_windows):
+        voice = "A" if i % 2 == 0 else "B"
+        f0 = VOICES[voice]
+        wave = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in range(1, 8))
+        wave *= 0.3 * (t < WINDOW_SECONDS - 0.8)  # trailing pause between turns
+        pieces.append(wave + 0.005 * rng.standard_normal(len(t)))
+        truth.append(voice)
+    samples = (np.concatenate(pieces) * 12000).astype(np.int16)
+    audio = AudioSegment(samples.tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1)
+    return audio, truth
+
+
+class _Slot:
+    def __init__(self):
+        self.callbacks = []
+
+    def connect(self, cb):
+        self.callbacks.append(cb)
+
+    def fire(self, evt):
+        for cb in self.callbacks:
+            cb(evt)
+
+
+class FakeTranscriber:
+    """Mimics ConversationTranscriber's event surface with deterministic output."""
+    chunk_counter = 0
+    lock = threading.Lock()
+
+    def __init__(self, chunk_audio, rtf):
+        self.audio = chunk_audio
+        self.rtf = rtf
+        self.transcribed = _Slot()
+        self.session_stopped = _Slot()
+        self.canceled = _Slot()
+        with FakeTranscriber.lock:
+            self.chunk_index = FakeTranscriber.chunk_counter
+            FakeTranscriber.chunk_counter += 1
+
+    def _label(self, start, end):
+        samples = np.frombuffer(self.audio.raw_data, dtype=np.int16)[start:end].astype(np.float32)
+        spectrum = np.abs(np.fft.rfft(samples))
+        freq = np.argmax(spectrum[1:]) * SAMPLE_RATE / len(samples)
+        voice = "A" if abs(freq - VOICES["A"]) < abs(freq - VOICES["B"]) else "B"
+        # Diarization IDs are chunk-local: odd chunks swap the names
+        if self.chunk_index % 2:
+            voice = "B" if voice == "A" else "A"
+        return f"Local-{voice}"
+
+    def _emit(self):
+        total = len(self.audio) / 1000
+        window = 0.0
+        while window < total - 1:
+            end = min(window + WINDOW_SECONDS - 0.8, total)
+            time.sleep((end - window) * self.rtf)
+            speaker = self._label(int(window * SAMPLE_RATE), int(end * SAMPLE_RATE))
+            result = SimpleNamespace(
+                reason=speechsdk.ResultReason.RecognizedSpeech, speaker_id=speaker,
+                text=f"utterance at {window:.1f}", offset=int(window * 10_000_000),
+                duration=int((end - window) * 10_000_000),
+            )
+            self.transcribed.fire(SimpleNamespace(result=result))
+            window += WINDOW_SECONDS
+        self.session_stopped.fire(SimpleNamespace(reason=None, error_details=None))
+
+    def start_transcribing_async(self):
+        threading.Thread(target=self._emit, daemon=True).start()
+        return SimpleNamespace(get=lambda: None)
+
+    def stop_transcribing_async(self):
+        return SimpleNamespace(get=lambda: None)
+
+
+def consistent(transcriptions, truth):
+    mapping = {}
+    for speaker, _, start, _ in transcriptions:
+        expected = truth[int(round(start / WINDOW_SECONDS))]
+        if mapping.setdefault(speaker, expected) != expected:
+            return False
+    return len(set(mapping.values())) == len(mapping)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=20)
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--rtf", type=float, default=0.01, help="fake seconds of work per second of audio")
+    args = parser.parse_args()
+
+    audio, truth = synth_recording(args.minutes)
+    for n_chunks in args.chunks:
+        FakeTranscriber.chunk_counter = 0
+
+        def factory(chunk_audio):
+            return FakeTranscriber(chunk_audio, args.rtf), lambda: None
+
+        start = time.perf_counter()
+        transcriptions, _ = asyncio.run(
+            transcribe_in_chunks(audio, audio, n_chunks, factory, run_transcription_async)
+        )
+        elapsed = time.perf_counter() - start
+        speakers = sorted({t[0] for t in transcriptions})
+        print(f"chunks={n_chunks:2d}  wall={elapsed:7.2f}s  utterances={len(transcriptions):5d}  "
+              f"speakers={speakers}  consistent={consistent(transcriptions, truth)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare the old double-decode path with the single-decode pipeline.
+
+    python benchmarks/bench_decode.py path/to/call.mp3
+    python benchmarks/bench_decode.py --generate-minutes 60   # synthesizes a test MP3 with ffmpeg
+
+Reports wall time and peak RSS for each path. Run each mode in a fresh process
+(--mode old / --mode new) to keep the peak-RSS numbers independent.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.speech_service import convert_audio_to_pcm_tempfile, decode_audio  # noqa: E402
+
+
+def generate_mp3(minutes):
+    path = os.path.join(tempfile.gettempdir(), f"bench_{minutes}min.mp3")
+    if not os.path.exists(path):
+        subprocess.run(
+            ["ffmpeg", "-y", "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={minutes * 60}",
+             "-ac", "2", "-b:a", "128k", path],
+            check=True, capture_output=True,
+        )
+    return path
+
+
+def run_old(path):
+    # Before: ffmpeg decode for the WAV, then a second ffmpeg decode for slicing
+    wav_path = convert_audio_to_pcm_tempfile(path, audio=AudioSegment.from_file(path))
+    original_audio = AudioSegment.from_file(path)
+    return wav_path, original_audio
+
+
+def run_new(path):
+    original_audio = decode_audio(path)
+    wav_path = convert_audio_to_pcm_tempfile(path, audio=original_audio)
+    return wav_path, original_audio
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?")
+    parser.add_argument("--generate-minutes", type=int, default=0)
+    parser.add_argument("--mode", choices=["old", "new", "both"], default="both")
+    args = parser.parse_args()
+
+    path = generate_mp3(args.generate_minutes) if args.generate_minutes else args.path
+    if not path:
+        parser.error("pass a file path or --generate-minutes")
+
+    modes = ["old", "new"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        start = time.perf_counter()
+        wav_path, _ = (run_old if mode == "old" else run_new)(path)
+        elapsed = time.perf_counter() - start
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+        os.remove(wav_path)
+        print(f"{mode:4s} decode+convert: {elapsed:7.2f}s  peak rss={peak_mb:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Throughput and 429s against a quota-enforcing Resemble stub, with and without the shared limiter.
+
+    python benchmarks/bench_rate_limiter.py --quota 20 --processes 4 --threads 8 --seconds 20
+
+The stub accepts `--quota` requests/second (token bucket, burst = quota) and answers
+429 with Retry-After: 1 above it. Worker processes call analyze_audio in a loop, like
+job workers do; counts are taken on the server side.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class QuotaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    quota = 20.0
+    lock = threading.Lock()
+    tokens = 20.0
+    refilled_at = time.monotonic()
+    counts = {"ok": 0, "throttled": 0}
+
+    def _allow(self):
+        cls = type(self)
+        with cls.lock:
+            now = time.monotonic()
+            cls.tokens = min(cls.quota, cls.tokens + (now - cls.refilled_at) * cls.quota)
+            cls.refilled_at = now
+            if cls.tokens >= 1:
+                cls.tokens -= 1
+                cls.counts["ok"] += 1
+                return True
+            cls.counts["throttled"] += 1
+            return False
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self._allow():
+            payload = json.dumps({"success": True, "item": {"uuid": uuid.uuid4().hex}}).encode()
+            self.send_response(200)
+        else:
+            payload = b"{}"
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def worker(seconds, threads):
+    from service.resemble_detection_service import analyze_audio
+
+    def loop():
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            try:
+                analyze_audio("x")
+            except Exception:
+                pass
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in range(threads):
+            executor.submit(loop)
+
+
+def run(limited, args, base_url):
+    QuotaHandler.counts = {"ok": 0, "throttled": 0}
+    os.environ.update({
+        "RESEMBLE_API_BASE_URL": base_url,
+        "RESEMBLE_API_TOKEN": "bench",
+        "RATE_LIMIT_ENABLED": "true" if limited else "false",
+        "RESEMBLE_RATE_LIMIT": str(args.quota),
+        "RESEMBLE_RATE_BURST": str(args.quota),
+        "JOB_QUEUE_DB": os.path.join(tempfile.mkdtemp(), "bench.sqlite3"),
+        "BREAKER_FAILURE_THRESHOLD": "1000000",
+        "RETRY_BUDGET_MAX": "1000000",
+    })
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=worker, args=(args.seconds, args.threads)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    counts = QuotaHandler.counts
+    print(f"{'limited' if limited else 'unlimited':9s}  accepted={counts['ok'] / args.seconds:7.1f}/s "
+          f"(quota {args.quota:g}/s)  429s={counts['throttled']:7d}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quota", type=float, default=20)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20)
+    args = parser.parse_args()
+
+    QuotaHandler.quota = QuotaHandler.tokens = args.quota
+    server = ThreadingHTTPServer(("127.0.0.1", 0), QuotaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/api/v2"
+
+    run(False, args, base_url)
+    run(True, args, base_url)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
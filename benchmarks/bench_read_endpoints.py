@@ -0,0 +1,82 @@
+"""
+Hammer /get_files while measuring latency of / and /resemble-callback.
+
+Run the API first (uvicorn main:app --port 8080), then:
+    python benchmarks/bench_read_endpoints.py --base-url http://127.0.0.1:8080 --duration 30
+
+With blocking reads the p99 of the probe endpoints tracks the /get_files query
+time; with the async read layer it should stay flat.
+"""
+import argparse
+import threading
+import time
+
+import requests
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def hammer(base_url, auth, stop, counter):
+    session = requests.Session()
+    while not stop.is_set():
+        session.get(f"{base_url}/get_files", auth=auth, timeout=60)
+        counter.append(1)
+
+
+def probe(base_url, stop, latencies):
+    session = requests.Session()
+    payload = {"item": {"uuid": None, "metrics": {}}}  # acked without touching the DB
+    while not stop.is_set():
+        start = time.perf_counter()
+        session.get(f"{base_url}/", timeout=60)
+        latencies["/"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        session.post(f"{base_url}/resemble-callback", json=payload, timeout=60)
+        latencies["/resemble-callback"].append(time.perf_counter() - start)
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://127.0.0.1:8080")
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--hammer-threads", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    latencies = {"/": [], "/resemble-callback": []}
+    hammered = []
+
+    threads = [
+        threading.Thread(target=hammer, args=(args.base_url, (args.user, args.password), stop, hammered), daemon=True)
+        for _ in range(args.hammer_threads)
+    ]
+    threads.append(threading.Thread(target=probe, args=(args.base_url, stop, latencies), daemon=True))
+    for t in threads:
+        t.start()
+
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join(timeout=60)
+
+    print(f"/get_files requests completed: {len(hammered)} ({len(hammered) / args.duration:.1f} req/s)")
+    for path, values in latencies.items():
+        print(
+            f"{path:20s} n={len(values):5d} "
+            f"p50={percentile(values, 50) * 1000:8.1f} ms "
+            f"p99={percentile(values, 99) * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
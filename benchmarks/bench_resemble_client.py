@@ -0,0 +1,126 @@
+"""
+Requests/second against a local Resemble stub: per-call requests vs pooled clients.
+
+    python benchmarks/bench_resemble_client.py --requests 2000 --threads 8
+    python benchmarks/bench_resemble_client.py --certfile cert.pem --keyfile key.pem   # include TLS handshakes
+
+"before" reproduces the old module-level requests.post/get per call;
+"session" and "async" go through service.resemble_client (async = asyncio.to_thread
+over the same session, so its pool size bounds concurrency).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle plus the
+        # client's delayed ACK adds ~40 ms to every reply on a kept-alive connection
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _reply(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply({"success": True, "item": {"uuid": uuid.uuid4().hex}})
+
+    def do_GET(self):
+        self._reply({"success": True, "item": {"metrics": {"label": "real", "score": [0.1], "consistency": 0.9,
+                                                           "aggregated_score": 0.1}}})
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(certfile=None, keyfile=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/api/v2"
+
+
+def run_threads(fn, total, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: fn(), range(total)))
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+
+    server, base_url = start_stub(args.certfile, args.keyfile)
+    os.environ["RESEMBLE_API_BASE_URL"] = base_url
+    os.environ.setdefault("RESEMBLE_API_TOKEN", "bench")
+    verify = not args.certfile
+
+    from service import resemble_client
+    from service.resemble_detection_service import (
+        analyze_audio, analyze_audio_async, fetch_metrics, fetch_metrics_async
+    )
+
+    resemble_client.get_session().verify = verify
+    headers = {"Authorization": "Bearer bench"}
+
+    def before():
+        requests.post(f"{base_url}/detect", headers=headers, params={"url": "x"}, data={}, verify=verify)
+        requests.get(f"{base_url}/detect/abc", headers=headers, verify=verify)
+
+    def pooled():
+        analyze_audio("x")
+        fetch_metrics("abc")
+
+    async def run_async():
+        semaphore = asyncio.Semaphore(args.threads)
+
+        async def one():
+            async with semaphore:
+                await analyze_audio_async("x")
+                await fetch_metrics_async("abc")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests // 2)))
+        return 2 * (args.requests // 2) / (time.perf_counter() - start)
+
+    # each path counts one submit + one poll per call
+    print(f"before  (no session):   {2 * run_threads(before, args.requests // 2, args.threads):8.1f} req/s")
+    print(f"session (keep-alive):   {2 * run_threads(pooled, args.requests // 2, args.threads):8.1f} req/s")
+    print(f"async   (to_thread):    {asyncio.run(run_async()):8.1f} req/s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
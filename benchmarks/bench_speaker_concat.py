@@ -0,0 +1,61 @@
+"""
+Micro-benchmark: per-speaker clip concatenation.
+
+    python benchmarks/bench_speaker_concat.py --utterances 1000 2000 4000
+
+"old" slices an AudioSegment per utterance and joins them with sum(clips);
+"new" keeps (start, end) frame offsets and copies them once into a
+preallocated buffer (service.audio_clips.build_speaker_track).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from pydub import AudioSegment
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.audio_clips import build_speaker_track, pcm_frames, seconds_to_frame  # noqa: E402
+
+
+def make_spans(n_utterances, total_seconds, seed=0):
+    rng = random.Random(seed)
+    spans = []
+    for _ in range(n_utterances):
+        start = rng.uniform(0, total_seconds - 5)
+        spans.append((start, start + rng.uniform(0.5, 4.0)))
+    return spans
+
+
+def run_old(audio, spans):
+    clips = [audio[start * 1000:end * 1000] for start, end in spans]
+    return sum(clips)
+
+
+def run_new(audio, spans):
+    frames = pcm_frames(audio)
+    offsets = [(seconds_to_frame(audio, s), seconds_to_frame(audio, e)) for s, e in spans]
+    return build_speaker_track(audio, offsets, frames=frames)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--utterances", type=int, nargs="+", default=[1000, 2000, 4000])
+    parser.add_argument("--minutes", type=int, default=60)
+    parser.add_argument("--frame-rate", type=int, default=44100)
+    args = parser.parse_args()
+
+    audio = AudioSegment.silent(duration=args.minutes * 60 * 1000, frame_rate=args.frame_rate)
+    for n in args.utterances:
+        spans = make_spans(n, args.minutes * 60)
+        for name, fn in (("old", run_old), ("new", run_new)):
+            start = time.perf_counter()
+            track = fn(audio, spans)
+            elapsed = time.perf_counter() - start
+            print(f"{n:6d} utterances  {name}: {elapsed:8.3f}s  ({len(track) / 1000:.0f}s of audio)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare how soon the Speech SDK can read its first audio in file vs stream input mode.
+
+    python benchmarks/bench_speech_input.py path/to/call.mp3
+    python benchmarks/bench_speech_input.py --generate-minutes 60
+
+file:   decode + 16 kHz WAV written to /tmp before AudioConfig(filename=...) can start.
+stream: the SDK pulls from an ffmpeg pipe, so its first read returns after the first
+        decoded frames. The pipe is drained here the way the SDK would read it, while
+        the full-quality decode for clip export runs alongside, as in recognize_from_file.
+
+Stream mode therefore decodes the file twice: CPU time (including ffmpeg children) and
+peak RSS are reported so the earlier start can be weighed against that cost. Run each
+mode in a fresh process (--mode file / --mode stream) for independent peak-RSS numbers.
+
+Time-to-first-utterance in production adds the service latency on top of these numbers;
+recognize_from_file logs it per job as "Time to first utterance".
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_decode import generate_mp3  # noqa: E402
+from service.pcm_stream import FfmpegPcmStream  # noqa: E402
+from service.speech_service import convert_audio_to_pcm_tempfile, decode_audio  # noqa: E402
+
+READ_SIZE = 3200  # 100 ms of 16 kHz mono PCM, about what the SDK asks for per read
+
+
+def run_file(path):
+    start = time.perf_counter()
+    wav_path = convert_audio_to_pcm_tempfile(path, audio=decode_audio(path))
+    first_audio = time.perf_counter() - start
+    disk_mb = os.path.getsize(wav_path) / (1024 * 1024)
+    os.remove(wav_path)
+    return first_audio, time.perf_counter() - start, disk_mb
+
+
+def run_stream(path):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        decoded = executor.submit(decode_audio, path)  # clip audio, decoded alongside the pipe
+        stream = FfmpegPcmStream(path)
+        buffer = memoryview(bytearray(READ_SIZE))
+        first_audio = None
+        while stream.read(buffer):
+            if first_audio is None:
+                first_audio = time.perf_counter() - start
+        stream.finish()
+        decoded.result()
+    return first_audio or 0.0, time.perf_counter() - start, 0.0
+
+
+def cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux; ffmpeg children are reported separately
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?")
+    parser.add_argument("--generate-minutes", type=int, default=0)
+    parser.add_argument("--mode", choices=["file", "stream", "both"], default="both")
+    args = parser.parse_args()
+
+    path = generate_mp3(args.generate_minutes) if args.generate_minutes else args.path
+    if not path:
+        parser.error("pass a file path or --generate-minutes")
+
+    modes = ["file", "stream"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        cpu_started = cpu_seconds()
+        first_audio, total, disk_mb = (run_file if mode == "file" else run_stream)(path)
+        peak_mb, child_peak_mb = peak_rss_mb()
+        print(f"{mode:6s} first audio: {first_audio:7.2f}s  all audio: {total:7.2f}s  "
+              f"cpu={cpu_seconds() - cpu_started:7.2f}s  temp disk={disk_mb:8.1f} MB  "
+              f"peak rss={peak_mb:8.1f} MB (ffmpeg {child_peak_mb:6.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
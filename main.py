@@ -1,40 +1,30 @@
 from datetime import datetime
-import json
 import os
-import shutil
-import tempfile
-from fastapi import BackgroundTasks, FastAPI, Request, UploadFile, File, Depends, HTTPException, status
+import uuid
+from fastapi import BackgroundTasks, FastAPI, Header, Request, Response, UploadFile, File, Depends, HTTPException, status
 from fastapi.params import Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from typing import Dict, List
-from psycopg2.extras import RealDictCursor
+from typing import List
 from fastapi.middleware.cors import CORSMiddleware
-from service.db_service import connect_to_db
+from service.db_service import close_pool, fetch_all, get_pool_stats, shutdown_read_executor
 from service.process_audio_resemble import process_audio
-from service.process_result_resemble import update_audio_data
+from service.process_result_resemble import get_callback_stats, update_audio_data
+from service.result_cache import get_cache_stats
+from service.resemble_completion import resolve
+from service.upload_service import UploadTooLargeError, remove_workspace, save_upload
+from service.job_queue import enqueue, get_queue_stats
+from service.resilience import bind_job_context, get_resilience_stats
+from service.rate_limiter import get_rate_limit_stats
+from service.metrics import job_metrics, render_prometheus
+from service.profiling import PROFILE_JOBS, list_profiles, profile_artifact, profile_job
+from starlette.concurrency import run_in_threadpool
+from worker import start_workers, stop_workers
 from dotenv import load_dotenv, find_dotenv
-import logging
-import sys
-
-from opencensus.ext.azure.log_exporter import AzureLogHandler
+from service.logging_config import get_logger, get_logging_stats, sampled
 load_dotenv(find_dotenv())
 
-# Create logger
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# Always log to console (local + Azure Log Stream)
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-logger.addHandler(console_handler)
-
-# Add Azure Application Insights handler only if connection string is present
-app_insights_conn = os.getenv("APP_INSIGHTS_CONNECTION_STRING")
-if app_insights_conn:
-    azure_handler = AzureLogHandler(connection_string=app_insights_conn)
-    azure_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-    logger.addHandler(azure_handler)
+logger = get_logger(__name__)
 
 logger.info("🚀 Application startup complete")
 
@@ -70,46 +60,68 @@ app.add_middleware(
 
 
 
-def background_task(file_path: str):
-    try:
-        results = process_audio(file_path)
-        # Here you can save results to DB instead of just printing
-        logger.info(f"✅ Finished processing {file_path}")
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            logger.info(f"🗑️ Deleted temp file {file_path}")
+# Worker processes that drain the job queue (set JOB_EMBEDDED_WORKERS=false to run `python worker.py` separately)
+JOB_EMBEDDED_WORKERS = os.getenv("JOB_EMBEDDED_WORKERS", "true").lower() == "true"
+worker_processes = []
+
+@app.on_event("startup")
+def start_job_workers():
+    if JOB_EMBEDDED_WORKERS:
+        worker_processes.extend(start_workers())
+        logger.info(f"Started {len(worker_processes)} job worker process(es)")
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    stop_workers(worker_processes)
 
 
 @app.post("/analyze-audio")
 async def analyze_audio(
-    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     user: str = Depends(authenticate),
+    x_profile_job: bool = Header(False),
 ):
     file_paths = []
+    content_hashes = {}
 
     # for file in files:
     #     suffix = os.path.splitext(file.filename)[-1]
     #     with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
     #         shutil.copyfileobj(file.file, temp_file)
     #         file_paths.append(temp_file.name)
-    for file in files:
-        safe_filename = file.filename.replace(" ", "_")   # replace spaces
-        temp_path = os.path.join(tempfile.gettempdir(), safe_filename)
-        with open(temp_path, "wb") as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
-        file_paths.append(temp_path)
-
-
-    # Schedule each file for background processing
-    for path in file_paths:
-        background_tasks.add_task(background_task, path)
+    try:
+        for file in files:
+            upload = await save_upload(file)
+            logger.info(f"Received {upload['file_name']} ({upload['size']} bytes, sha256={upload['sha256']})")
+            file_paths.append(upload["path"])
+            content_hashes[upload["path"]] = upload["sha256"]
+    except UploadTooLargeError as e:
+        for path in file_paths:
+            remove_workspace(path)
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+
+
+    # Hand each file to the durable job queue; worker processes do the processing
+    profile_ids = []
+    for index, path in enumerate(file_paths):
+        try:
+            job_id = await run_in_threadpool(enqueue, path, content_hashes[path], profile=x_profile_job)
+        except Exception:
+            # Uploads not queued yet would never be processed or cleaned up
+            for pending in file_paths[index:]:
+                remove_workspace(pending)
+            raise
+        logger.info(f"Queued job {job_id} for {path}")
+        if x_profile_job or PROFILE_JOBS:
+            profile_ids.append(f"job-{job_id}")
 
-    return {
+    response = {
         "message": f"Processing started for {len(file_paths)} file(s).",
         "files": [os.path.basename(p) for p in file_paths],
     }
+    if profile_ids:
+        response["profiles"] = profile_ids  # see /debug/profiles/{profile_id} once the jobs finish
+    return response
 
 @app.post("/resemble-callback")
 async def resemble_callback(request: Request, background_tasks: BackgroundTasks):
@@ -122,10 +134,12 @@ async def resemble_callback(request: Request, background_tasks: BackgroundTasks)
         metrics = item.get("metrics", {})
 
         logger.info(f"Received callback for UUID: {file_uuid}")
-        logger.info(f"Metrics: {metrics}")
+        if sampled("callback_metrics"):
+            logger.info(f"Metrics for {file_uuid}: {metrics}")
 
         # Run DB update in the background
         if file_uuid and metrics:
+            background_tasks.add_task(resolve, file_uuid, metrics)  # wake the job waiting on this UUID
             background_tasks.add_task(update_audio_data, file_uuid, metrics)
 
         # Respond immediately
@@ -139,13 +153,9 @@ async def resemble_callback(request: Request, background_tasks: BackgroundTasks)
 
 @app.get("/get-results")
 async def get_results(file_name: str = Query(..., description="File name to fetch result for"),file_id:str = Query(..., description="File id to fetch result for"), user: str = Depends(authenticate)):
-    cur, conn = connect_to_db()
-    cur.execute("SELECT * FROM audio_data WHERE file_name = %s AND file_id = %s", (file_name, file_id))
-    rows = cur.fetchall()
-
-    colnames = [desc[0] for desc in cur.description]  # get column names
-    cur.close()
-    conn.close()
+    rows, colnames = await fetch_all(
+        "SELECT * FROM audio_data WHERE file_name = %s AND file_id = %s", (file_name, file_id)
+    )
 
     if not rows:
         return JSONResponse({"error": "No records found"}, status_code=404)
@@ -194,8 +204,6 @@ async def get_files(
     format: str = Query(None, description="Filter by file extension (.mp3, .wav, .m4a)")
 ):
     try:
-        cur, conn = connect_to_db()
-
         # Base query
         query = """
             SELECT DISTINCT ON (file_id)
@@ -228,10 +236,7 @@ async def get_files(
             query += " AND " + " AND ".join(conditions)
 
         logger.info(query)
-        cur.execute(query, tuple(params))
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        rows, _ = await fetch_all(query, params)
 
         if not rows:
             return JSONResponse({"files": "No files found"}, status_code=200)
@@ -284,6 +289,96 @@ async def get_files(
 #     except Exception as e:
 #         return JSONResponse({"error": str(e)}, status_code=500)
 
+@app.get("/db-pool-stats")
+async def db_pool_stats(user: str = Depends(authenticate)):
+    """
+    Connection pool usage: wait time, in-use and idle connections.
+    """
+    return get_pool_stats()
+
+@app.get("/queue-stats")
+async def queue_stats(user: str = Depends(authenticate)):
+    """
+    Job queue depth by status.
+    """
+    return await run_in_threadpool(get_queue_stats)
+
+@app.get("/callback-stats")
+async def callback_stats(user: str = Depends(authenticate)):
+    """
+    Resemble callback reconciliation counters (orphaned, late, duplicate, ...).
+    """
+    return await run_in_threadpool(get_callback_stats)
+
+@app.get("/cache-stats")
+async def cache_stats(user: str = Depends(authenticate)):
+    """
+    Result cache hit/miss counters.
+    """
+    return get_cache_stats()
+
+@app.get("/resilience-stats")
+async def resilience_stats(user: str = Depends(authenticate)):
+    """
+    Circuit breaker state and retry budgets for Speech, Blob and Resemble, per process.
+    """
+    return await run_in_threadpool(get_resilience_stats)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(user: str = Depends(authenticate)):
+    """
+    Per-stage latency histograms and counters for all processes, in Prometheus text format.
+    """
+    return PlainTextResponse(
+        await run_in_threadpool(render_prometheus), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@app.get("/rate-limit-stats")
+async def rate_limit_stats(user: str = Depends(authenticate)):
+    """
+    Client-side token buckets and AIMD concurrency windows for Resemble and Speech.
+    """
+    return await run_in_threadpool(get_rate_limit_stats)
+
+@app.get("/debug/profiles")
+async def debug_profiles(user: str = Depends(authenticate)):
+    """
+    Job profiles on this host, requested with the X-Profile-Job header or PROFILE_JOBS.
+    """
+    return await run_in_threadpool(list_profiles)
+
+@app.get("/debug/profiles/{profile_id}")
+async def debug_profile(profile_id: str, user: str = Depends(authenticate)):
+    """
+    Profile summary: wall/CPU time, peak RSS and traced memory per stage, top allocations.
+    """
+    path = profile_artifact(profile_id, "summary.json")
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="application/json")
+
+@app.get("/debug/profiles/{profile_id}/cpu")
+async def debug_profile_cpu(profile_id: str, user: str = Depends(authenticate)):
+    """
+    Sampled CPU stacks in collapsed format (flamegraph.pl, speedscope).
+    """
+    path = profile_artifact(profile_id, "cpu.folded")
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain")
+
+@app.get("/logging-stats")
+async def logging_stats(user: str = Depends(authenticate)):
+    """
+    Log queue depth, records dropped when it was full, and line sampling settings.
+    """
+    return get_logging_stats()
+
+@app.on_event("shutdown")
+def shutdown_db_pool():
+    shutdown_read_executor()
+    close_pool()
+
 @app.get("/")
 async def health_check():
     """
@@ -351,12 +446,18 @@ async def health_check():
 #         )
 
 @app.post("/analyze-audio2")
-async def analyze_audio(file: UploadFile = File(...), user: str = Depends(authenticate)):
-    # Create a temporary file
-    safe_filename = file.filename.replace(" ", "_")   # replace spaces
-    temp_path = os.path.join(tempfile.gettempdir(), safe_filename)
-    with open(temp_path, "wb") as temp_file:
-        shutil.copyfileobj(file.file, temp_file)
+async def analyze_audio(
+    response: Response,
+    file: UploadFile = File(...),
+    user: str = Depends(authenticate),
+    x_profile_job: bool = Header(False),
+):
+    # Stream the upload into its own workspace
+    try:
+        upload = await save_upload(file)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    temp_path = upload["path"]
 
     # try:
     #     # Call your function
@@ -368,7 +469,14 @@ async def analyze_audio(file: UploadFile = File(...), user: str = Depends(authen
     #         os.remove(temp_path)
     try:
         # Call your function
-        results = process_audio(temp_path)
+        profile_id = f"request-{uuid.uuid4().hex}"
+        with job_metrics(temp_path), profile_job(profile_id, enabled=x_profile_job) as profiler:
+            if profiler is not None:
+                response.headers["X-Profile-Id"] = profile_id
+            # Off the event loop: processing blocks for the length of the recording
+            results = await run_in_threadpool(
+                bind_job_context(process_audio), temp_path, content_hash=upload["sha256"], wait_for_results=True
+            )
         return results
     except Exception as e:
         import traceback
@@ -386,9 +494,8 @@ async def analyze_audio(file: UploadFile = File(...), user: str = Depends(authen
             "trace": error_trace
         }
     finally:
-        # Cleanup temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        # Cleanup temp file and its workspace
+        remove_workspace(temp_path)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,64 @@
+import numpy as np
+from pydub import AudioSegment
+
+
+def pcm_frames(audio: AudioSegment) -> np.ndarray:
+    """
+    Zero-copy (n_frames, frame_width) byte view over the decoded PCM buffer.
+    Works for any sample width / channel count since each row is one frame.
+    """
+    return np.frombuffer(audio.raw_data, dtype=np.uint8).reshape(-1, audio.frame_width)
+
+
+def pcm_samples(audio: AudioSegment) -> np.ndarray:
+    """Mono float32 samples of a 16-bit AudioSegment."""
+    return np.frombuffer(audio.raw_data, dtype=np.int16).astype(np.float32)
+
+
+def frame_energy(samples: np.ndarray, sample_rate: int, frame_ms: int = 30):
+    """Vectorized per-frame RMS energy (dB); returns (energy, samples per frame)."""
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = len(samples) // frame_len
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-9)
+    return 20 * np.log10(rms + 1e-9), frame_len
+
+
+def seconds_to_frame(audio: AudioSegment, seconds: float) -> int:
+    return max(0, min(int(round(seconds * audio.frame_rate)), int(audio.frame_count())))
+
+
+def rescale_spans(spans, from_rate: int, to_rate: int):
+    """Convert (start_frame, end_frame) spans counted at one sample rate to another."""
+    if from_rate == to_rate:
+        return list(spans)
+    ratio = to_rate / from_rate
+    return [(int(round(start * ratio)), int(round(end * ratio))) for start, end in spans]
+
+
+def build_speaker_track(audio: AudioSegment, spans, max_ms=0, frames=None) -> AudioSegment:
+    """
+    Concatenate (start_frame, end_frame) spans of the decoded audio into one track.
+    The output buffer is allocated once, so cost is linear in the number of spans.
+    If max_ms > 0 the track is cut at that length without copying the rest.
+    """
+    if frames is None:
+        frames = pcm_frames(audio)
+
+    n_frames = len(frames)
+    spans = [(start, min(end, n_frames)) for start, end in spans]
+    limit = int(max_ms * audio.frame_rate / 1000) if max_ms > 0 else None
+    total = sum(max(0, end - start) for start, end in spans)
+    if limit is not None:
+        total = min(total, limit)
+
+    track = np.empty((total, audio.frame_width), dtype=np.uint8)
+    position = 0
+    for start, end in spans:
+        if position >= total:
+            break
+        length = min(max(0, end - start), total - position)
+        track[position:position + length] = frames[start:start + length]
+        position += length
+
+    return audio._spawn(track.tobytes())
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import tempfile
+from collections import defaultdict
+
+import azure.cognitiveservices.speech as speechsdk
+import numpy as np
+
+from service.audio_clips import frame_energy, pcm_samples, seconds_to_frame
+
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Chunks are cut at the quietest point within this many seconds of the even split
+CHUNK_SPLIT_SEARCH_SECONDS = float(os.getenv("CHUNK_SPLIT_SEARCH_SECONDS", "30"))
+# Shorter audio is split into fewer chunks, so no chunk is shorter than half of this
+CHUNK_MIN_SECONDS = float(os.getenv("CHUNK_MIN_SECONDS", "30"))
+# Cosine similarity needed to treat a chunk-local speaker as an already known speaker
+SPEAKER_MATCH_THRESHOLD = float(os.getenv("SPEAKER_MATCH_THRESHOLD", "0.85"))
+
+_FRAME_MS = 30
+_N_BANDS = 24
+
+
+def find_split_points(samples, sample_rate, n_chunks, search_seconds=None, min_chunk_seconds=None):
+    """
+    Sample offsets splitting the audio into at most n_chunks of about min_chunk_seconds
+    or more. Each cut moves to the lowest-energy frame within `search_seconds` of the even
+    split point, but never more than a quarter chunk away, so every chunk keeps at least
+    half the even length and the points stay increasing.
+    """
+    if search_seconds is None:
+        search_seconds = CHUNK_SPLIT_SEARCH_SECONDS
+    if min_chunk_seconds is None:
+        min_chunk_seconds = CHUNK_MIN_SECONDS
+    energy, frame_len = frame_energy(samples, sample_rate, _FRAME_MS)
+    min_frames = max(1, int(min_chunk_seconds * 1000 / _FRAME_MS))
+    n_chunks = max(1, min(n_chunks, len(energy) // min_frames))
+    chunk_frames = len(energy) / n_chunks
+    window = min(int(search_seconds * 1000 / _FRAME_MS), int(chunk_frames / 4))
+
+    points = [0]
+    for i in range(1, n_chunks):
+        target = int(chunk_frames * i)
+        lo = target - window
+        points.append((lo + int(np.argmin(energy[lo:target + window + 1]))) * frame_len)
+    points.append(len(samples))
+    return points
+
+
+def speaker_embedding(samples, sample_rate, spans):
+    """
+    Crude voice fingerprint: mean log power in _N_BANDS linear frequency bands
+    over the speaker's utterances, mean-normalized. Good enough to re-link the
+    same diarized speaker across chunks of one recording.
+    """
+    frame_len = max(1, int(sample_rate * _FRAME_MS / 1000))
+    pieces = [samples[start:end] for start, end in spans if end - start >= frame_len]
+    if not pieces:
+        return None
+    voiced = np.concatenate(pieces)
+    n_frames = len(voiced) // frame_len
+    frames = voiced[:n_frames * frame_len].reshape(n_frames, frame_len) * np.hanning(frame_len)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    bands = np.array_split(power, _N_BANDS, axis=1)
+    log_bands = np.log(np.stack([band.mean(axis=1) for band in bands], axis=1) + 1e-9).mean(axis=0)
+    log_bands -= log_bands.mean()
+    norm = np.linalg.norm(log_bands)
+    return log_bands / norm if norm > 0 else None
+
+
+class SpeakerStitcher:
+    """Maps chunk-local diarization IDs onto consistent file-wide speaker IDs."""
+
+    def __init__(self, threshold=None):
+        self.threshold = SPEAKER_MATCH_THRESHOLD if threshold is None else threshold
+        self.embeddings = {}  # global speaker -> unit vector
+        self.weights = {}
+
+    def _new_speaker(self, embedding):
+        name = f"Guest-{len(self.embeddings) + 1}"
+        self.embeddings[name] = embedding
+        self.weights[name] = 1
+        return name
+
+    def assign(self, local_embeddings):
+        """local_embeddings: {local_id: embedding or None} -> {local_id: global_id}"""
+        mapping = {}
+        candidates = []
+        for local_id, embedding in local_embeddings.items():
+            if local_id == "Unknown" or embedding is None:
+                continue
+            for global_id, known in self.embeddings.items():
+                candidates.append((float(np.dot(embedding, known)), local_id, global_id))
+
+        # Greedy one-to-one matching, best similarity first
+        used = set()
+        for score, local_id, global_id in sorted(candidates, reverse=True):
+            if score < self.threshold or local_id in mapping or global_id in used:
+                continue
+            mapping[local_id] = global_id
+            used.add(global_id)
+            weight = self.weights[global_id]
+            merged = (self.embeddings[global_id] * weight + local_embeddings[local_id]) / (weight + 1)
+            self.embeddings[global_id] = merged / np.linalg.norm(merged)
+            self.weights[global_id] = weight + 1
+
+        for local_id, embedding in local_embeddings.items():
+            if local_id in mapping:
+                continue
+            if local_id == "Unknown":
+                mapping[local_id] = "Unknown"
+            elif embedding is None:
+                mapping[local_id] = self._new_speaker(np.zeros(_N_BANDS))
+            else:
+                mapping[local_id] = self._new_speaker(embedding)
+        return mapping
+
+
+def sdk_transcriber_factory(speech_config):
+    """Default factory: one Azure ConversationTranscriber per chunk, fed from a temp WAV."""
+    def factory(chunk_audio):
+        temp_wav = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
+        temp_wav.close()
+        chunk_audio.export(temp_wav.name, format="wav")
+        audio_config = speechsdk.audio.AudioConfig(filename=temp_wav.name)
+        transcriber = speechsdk.transcription.ConversationTranscriber(
+            speech_config=speech_config,
+            audio_config=audio_config
+        )
+
+        def cleanup():
+            if os.path.exists(temp_wav.name):
+                os.remove(temp_wav.name)
+        return transcriber, cleanup
+    return factory
+
+
+async def transcribe_in_chunks(speech_audio, original_audio, n_chunks, transcriber_factory, run_transcription):
+    """
+    Split 16 kHz mono `speech_audio` at silences into n_chunks, transcribe the
+    chunks concurrently and stitch the results back into file time.
+
+    Args:
+        transcriber_factory: chunk AudioSegment -> (transcriber, cleanup)
+        run_transcription: awaitable runner (speech_service.run_transcription_async),
+            called with allow_empty=True
+
+    Returns:
+        (transcriptions, speaker_clips) in the same shape recognize_from_file
+        builds: [(speaker, text, start, end)] and {speaker: [(start_frame, end_frame)]}
+        with frames relative to original_audio.
+    """
+    sample_rate = speech_audio.frame_rate
+    samples = pcm_samples(speech_audio)
+    points = find_split_points(samples, sample_rate, n_chunks)
+    logger.info(f"Transcribing {len(points) - 1} chunks at {[round(p / sample_rate, 1) for p in points[:-1]]}s")
+
+    async def _run_chunk(start, end):
+        chunk_audio = speech_audio._spawn(speech_audio.raw_data[start * 2:end * 2])
+        transcriber, cleanup = transcriber_factory(chunk_audio)
+        chunk_clips = defaultdict(list)
+        chunk_transcriptions = []
+        try:
+            # A chunk may be all silence or music; that is an empty result, not a failure
+            await run_transcription(transcriber, chunk_audio, chunk_clips, chunk_transcriptions, allow_empty=True)
+        finally:
+            cleanup()
+        return chunk_transcriptions
+
+    results = await asyncio.gather(*(
+        _run_chunk(start, end) for start, end in zip(points[:-1], points[1:])
+    ))
+
+    stitcher = SpeakerStitcher()
+    transcriptions = []
+    for chunk_start, chunk_transcriptions in zip(points[:-1], results):
+        offset = chunk_start / sample_rate
+        local_spans = defaultdict(list)
+        for speaker, _, start, end in chunk_transcriptions:
+            local_spans[speaker].append((chunk_start + int(start * sample_rate), chunk_start + int(end * sample_rate)))
+        mapping = stitcher.assign({
+            speaker: speaker_embedding(samples, sample_rate, spans) for speaker, spans in local_spans.items()
+        })
+        for speaker, text, start, end in chunk_transcriptions:
+            transcriptions.append((mapping[speaker], text, start + offset, end + offset))
+
+    transcriptions.sort(key=lambda t: t[2])
+    speaker_clips = defaultdict(list)
+    for speaker, _, start, end in transcriptions:
+        speaker_clips[speaker].append((seconds_to_frame(original_audio, start), seconds_to_frame(original_audio, end)))
+    return transcriptions, speaker_clips
@@ -1,40 +1,193 @@
+import asyncio
 import os
-import psycopg2
-from dotenv import load_dotenv, find_dotenv
-import logging
-import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
-from opencensus.ext.azure.log_exporter import AzureLogHandler
+from psycopg2 import pool as pg_pool
+from dotenv import load_dotenv, find_dotenv
+from service.logging_config import get_logger
 load_dotenv(find_dotenv())
 
-# Create logger
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# Always log to console (local + Azure Log Stream)
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-logger.addHandler(console_handler)
-
-# Add Azure Application Insights handler only if connection string is present
-app_insights_conn = os.getenv("APP_INSIGHTS_CONNECTION_STRING")
-if app_insights_conn:
-    azure_handler = AzureLogHandler(connection_string=app_insights_conn)
-    azure_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-    logger.addHandler(azure_handler)
-def connect_to_db():
+logger = get_logger(__name__)
+
+# 🔹 Connection pool settings (shared by every code path in the process)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "60"))  # ping connections idle longer than this
+DB_READ_WORKERS = int(os.getenv("DB_READ_WORKERS", str(DB_POOL_MAX_SIZE)))  # threads serving async reads
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_SIZE)
+_last_used = {}  # id(connection) -> time it was returned to the pool
+_stats_lock = threading.Lock()
+_open_connections = set()  # id() of every live connection handed out at least once
+_stats = {
+    "checkouts": 0,
+    "in_use": 0,
+    "discarded": 0,
+    "timeouts": 0,
+    "wait_time_total": 0.0,
+    "wait_time_max": 0.0,
+}
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pg_pool.ThreadedConnectionPool(
+                    DB_POOL_MIN_SIZE,
+                    DB_POOL_MAX_SIZE,
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    host=os.getenv("DB_HOST"),
+                    port=os.getenv("DB_PORT"),
+                    database=os.getenv("DB_NAME"),
+                )
+                logger.info(f"DB pool created (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+    return _pool
+
+
+def _is_healthy(connection):
+    if connection.closed:
+        return False
+    idle_for = time.monotonic() - _last_used.get(id(connection), 0.0)
+    if idle_for < DB_POOL_HEALTHCHECK_IDLE:
+        return True
     try:
-        # Connect to your postgres DB
-        connection = psycopg2.connect(user=os.getenv("DB_USER"), password=os.getenv("DB_PASSWORD"), host=os.getenv("DB_HOST"), port=os.getenv("DB_PORT"), database=os.getenv("DB_NAME"))
-        
-        # logger.info(connection)
-        
-        cursor = connection.cursor()
-        cursor.execute("SELECT version();")
-        db_version = cursor.fetchone()
-        # logger.info(f"Connected to database: {db_version[0]}")
-        return cursor, connection
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+        connection.rollback()
+        return True
     except Exception as e:
-        logger.info(f"Error connecting to database: {e}")
-        return None
- 
\ No newline at end of file
+        logger.info(f"Discarding unhealthy DB connection: {e}")
+        return False
+
+
+def _checkout():
+    wait_start = time.monotonic()
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        with _stats_lock:
+            _stats["timeouts"] += 1
+        raise TimeoutError(f"Timed out after {DB_POOL_TIMEOUT}s waiting for a DB connection")
+
+    try:
+        db_pool = _get_pool()
+        connection = db_pool.getconn()
+        while not _is_healthy(connection):
+            db_pool.putconn(connection, close=True)
+            _last_used.pop(id(connection), None)
+            with _stats_lock:
+                _open_connections.discard(id(connection))
+                _stats["discarded"] += 1
+            connection = db_pool.getconn()
+    except Exception:
+        _pool_slots.release()
+        raise
+
+    waited = time.monotonic() - wait_start
+    with _stats_lock:
+        _open_connections.add(id(connection))
+        _stats["checkouts"] += 1
+        _stats["in_use"] += 1
+        _stats["wait_time_total"] += waited
+        _stats["wait_time_max"] = max(_stats["wait_time_max"], waited)
+    return connection
+
+
+def _release(connection, broken=False):
+    close = broken or connection.closed
+    try:
+        if close:
+            _last_used.pop(id(connection), None)
+        else:
+            _last_used[id(connection)] = time.monotonic()
+        _get_pool().putconn(connection, close=close)
+    finally:
+        with _stats_lock:
+            if close:
+                _open_connections.discard(id(connection))
+            _stats["in_use"] -= 1
+        _pool_slots.release()
+
+
+@contextmanager
+def get_db_connection(cursor_factory=None):
+    """
+    Check out a pooled connection and yield (cursor, connection).
+    Rolls back on error; the caller commits explicitly, as before.
+    """
+    connection = _checkout()
+    broken = False
+    cursor = None
+    try:
+        cursor = connection.cursor(cursor_factory=cursor_factory)
+        yield cursor, connection
+    except Exception:
+        try:
+            connection.rollback()
+        except Exception:
+            broken = True
+        raise
+    finally:
+        if cursor is not None and not cursor.closed:
+            cursor.close()
+        if not broken and not connection.closed:
+            try:
+                connection.rollback()  # never hand back a connection mid-transaction
+            except Exception:
+                broken = True
+        _release(connection, broken=broken)
+
+
+# 🔹 Async reads: blocking psycopg2 calls run on a dedicated, bounded executor
+_read_executor = ThreadPoolExecutor(max_workers=DB_READ_WORKERS, thread_name_prefix="db-read")
+
+
+def _fetch_all(query, params):
+    with get_db_connection() as (cursor, connection):
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        colnames = [desc[0] for desc in cursor.description]
+    return rows, colnames
+
+
+async def fetch_all(query, params=()):
+    """
+    Run a read query off the event loop.
+    Returns (rows, column_names).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_read_executor, _fetch_all, query, tuple(params))
+
+
+def get_pool_stats():
+    """Snapshot of pool usage for monitoring."""
+    with _stats_lock:
+        stats = dict(_stats)
+        stats["idle"] = max(0, len(_open_connections) - stats["in_use"])
+    stats["max_size"] = DB_POOL_MAX_SIZE
+    stats["min_size"] = DB_POOL_MIN_SIZE
+    stats["wait_time_avg"] = stats["wait_time_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    return stats
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+            with _stats_lock:
+                _open_connections.clear()
+            logger.info("DB pool closed")
+
+
+def shutdown_read_executor():
+    _read_executor.shutdown(wait=False, cancel_futures=True)
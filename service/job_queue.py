@@ -0,0 +1,253 @@
+import contextlib
+import contextvars
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", os.path.join(os.getenv("UPLOAD_ROOT", tempfile.gettempdir()), "jobs.sqlite3"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))  # renewed by a heartbeat while the job runs
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "30"))  # seconds, doubled per attempt
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    file_path TEXT NOT NULL,
+    content_hash TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',   -- queued | running | done | failed
+    stage TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    last_error TEXT,
+    profile INTEGER NOT NULL DEFAULT 0,      -- 1: write a CPU/memory profile (service.profiling)
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim_idx ON jobs (status, available_at);
+"""
+
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def _connect():
+    connection = sqlite3.connect(JOB_QUEUE_DB, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    if JOB_QUEUE_DB not in _initialized:
+        with _init_lock:
+            if JOB_QUEUE_DB not in _initialized:
+                connection.execute("PRAGMA journal_mode=WAL;")
+                connection.executescript(_SCHEMA)
+                columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs);")}
+                if "profile" not in columns:
+                    connection.execute("ALTER TABLE jobs ADD COLUMN profile INTEGER NOT NULL DEFAULT 0;")
+                _initialized.add(JOB_QUEUE_DB)
+    return connection
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def enqueue(file_path, content_hash=None, max_attempts=None, profile=False):
+    """Persist a job and return its id. The HTTP handler does nothing else."""
+    now = time.time()
+    connection = _connect()
+    try:
+        cursor = connection.execute(
+            """
+            INSERT INTO jobs (file_path, content_hash, max_attempts, profile, available_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (file_path, content_hash, max_attempts or JOB_MAX_ATTEMPTS, int(profile), now, now, now),
+        )
+        return cursor.lastrowid
+    finally:
+        connection.close()
+
+
+def claim(owner, discard=None):
+    """
+    Lease the oldest runnable job (queued, or running with an expired lease and
+    attempts left). Returns the job row as a dict, or None when the queue is empty.
+
+    A job whose lease expired on its last attempt (its worker crashed or was
+    OOM-killed, so fail() never ran) is marked failed instead; discard(job) is
+    called for each one after the commit, to clean up its upload.
+    """
+    now = time.time()
+    connection = _connect()
+    try:
+        connection.execute("BEGIN IMMEDIATE;")
+        exhausted = [dict(row) for row in connection.execute(
+            "SELECT * FROM jobs WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts",
+            (now,),
+        )]
+        for job in exhausted:
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires_at = NULL, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (f"Lease expired on attempt {job['attempts']} of {job['max_attempts']}", now, job["id"]),
+            )
+        row = connection.execute(
+            """
+            SELECT * FROM jobs
+            WHERE (status = 'queued' AND available_at <= ?)
+               OR (status = 'running' AND lease_expires_at < ? AND attempts < max_attempts)
+            ORDER BY id
+            LIMIT 1
+            """,
+            (now, now),
+        ).fetchone()
+        if row is not None:
+            connection.execute(
+                """
+                UPDATE jobs
+                SET status = 'running', lease_owner = ?, lease_expires_at = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+                """,
+                (owner, now + JOB_LEASE_SECONDS, now, row["id"]),
+            )
+        connection.execute("COMMIT;")
+    except Exception:
+        connection.execute("ROLLBACK;")
+        raise
+    finally:
+        connection.close()
+
+    if discard is not None:
+        for job in exhausted:
+            discard(job)
+    if row is None:
+        return None
+    job = dict(row)
+    job["attempts"] += 1
+    return job
+
+
+def renew_lease(job_id, owner):
+    now = time.time()
+    connection = _connect()
+    try:
+        cursor = connection.execute(
+            "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND status = 'running'",
+            (now + JOB_LEASE_SECONDS, now, job_id, owner),
+        )
+        return cursor.rowcount == 1
+    finally:
+        connection.close()
+
+
+def set_stage(job_id, stage):
+    connection = _connect()
+    try:
+        connection.execute("UPDATE jobs SET stage = ?, updated_at = ? WHERE id = ?", (stage, time.time(), job_id))
+    finally:
+        connection.close()
+
+
+class LeaseLost(RuntimeError):
+    """Another worker re-claimed the job; this worker must stop without writing results."""
+
+
+class JobLease:
+    def __init__(self, job_id, owner):
+        self.job_id = job_id
+        self.owner = owner
+        self.lost = threading.Event()  # set by the heartbeat when a renewal fails
+
+
+_lease = contextvars.ContextVar("job_lease", default=None)
+
+
+@contextlib.contextmanager
+def holding(job_id, owner):
+    """Make the job's lease visible to enter_stage() in the block (and in bound executor threads)."""
+    lease = JobLease(job_id, owner)
+    token = _lease.set(lease)
+    try:
+        yield lease
+    finally:
+        _lease.reset(token)
+
+
+def enter_stage(stage, verify=False):
+    """
+    Record the pipeline stage the current job is in; a no-op outside a queued job.
+    Raises LeaseLost once the lease is gone. verify=True renews the lease first, so
+    a write that follows is made only while this worker still owns the job.
+    """
+    lease = _lease.get()
+    if lease is None:
+        return
+    if not lease.lost.is_set() and verify and not renew_lease(lease.job_id, lease.owner):
+        lease.lost.set()
+    if lease.lost.is_set():
+        raise LeaseLost(f"Lost lease on job {lease.job_id}")
+    set_stage(lease.job_id, stage)
+
+
+def complete(job_id, owner):
+    connection = _connect()
+    try:
+        connection.execute(
+            "UPDATE jobs SET status = 'done', lease_owner = NULL, lease_expires_at = NULL, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ?",
+            (time.time(), job_id, owner),
+        )
+    finally:
+        connection.close()
+
+
+def fail(job_id, owner, error):
+    """
+    Record a failure. Requeues with exponential backoff while attempts remain.
+    Returns True if the job will be retried.
+    """
+    now = time.time()
+    connection = _connect()
+    try:
+        row = connection.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        retry = row is not None and row["attempts"] < row["max_attempts"]
+        if retry:
+            delay = JOB_RETRY_BASE_DELAY * (2 ** (row["attempts"] - 1))
+            connection.execute(
+                "UPDATE jobs SET status = 'queued', available_at = ?, lease_owner = NULL, lease_expires_at = NULL, "
+                "last_error = ?, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (now + delay, str(error), now, job_id, owner),
+            )
+        else:
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires_at = NULL, "
+                "last_error = ?, updated_at = ? WHERE id = ? AND lease_owner = ?",
+                (str(error), now, job_id, owner),
+            )
+        return retry
+    finally:
+        connection.close()
+
+
+def get_queue_stats():
+    """Queue depth by status, plus the age of the oldest waiting job."""
+    now = time.time()
+    connection = _connect()
+    try:
+        stats = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        for row in connection.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            stats[row["status"]] = row["n"]
+        oldest = connection.execute("SELECT MIN(created_at) AS t FROM jobs WHERE status = 'queued'").fetchone()["t"]
+        stats["oldest_queued_age_seconds"] = now - oldest if oldest else 0.0
+        stats["expired_leases"] = connection.execute(
+            "SELECT COUNT(*) AS n FROM jobs WHERE status = 'running' AND lease_expires_at < ?", (now,)
+        ).fetchone()["n"]
+        return stats
+    finally:
+        connection.close()
@@ -0,0 +1,155 @@
+"""
+Process-wide logging setup.
+
+Modules log through one QueueHandler on the root logger; a QueueListener thread does
+the console and Application Insights I/O. Request handlers and Speech SDK callback
+threads only pay for putting a record on a bounded queue, and records are dropped
+(and counted) rather than waited on when the queue is full.
+"""
+import atexit
+import itertools
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+from dotenv import load_dotenv, find_dotenv
+from opencensus.ext.azure.log_exporter import AzureLogHandler
+
+load_dotenv(find_dotenv())
+
+
+def _parse_pairs(value, convert):
+    pairs = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, setting = item.split("=", 1)
+            pairs[key.strip()] = convert(setting.strip())
+    return pairs
+
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-logger levels, e.g. "service.speech_service=WARNING,main=DEBUG"
+LOG_LEVELS = _parse_pairs(os.getenv("LOG_LEVELS", ""), str.upper)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records waiting for the listener
+# Keep 1 in N of the high-volume lines guarded by sampled(key)
+LOG_SAMPLE_EVERY = _parse_pairs(os.getenv("LOG_SAMPLE_EVERY", "callback_metrics=20,utterance=10"), int)
+
+_lock = threading.Lock()
+_listener = None
+_handler = None
+_dropped = 0
+_sample_counters = {}
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            global _dropped
+            with _lock:
+                _dropped += 1
+
+
+class _SkipExporterRecords(logging.Filter):
+    # The exporter logs its own failures; shipping those back to it would loop
+    def filter(self, record):
+        return not record.name.startswith("opencensus")
+
+
+def _output_handlers():
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    # Always log to console (local + Azure Log Stream)
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+    handlers = [console_handler]
+
+    # Add Azure Application Insights handler only if connection string is present
+    app_insights_conn = os.getenv("APP_INSIGHTS_CONNECTION_STRING")
+    if app_insights_conn:
+        azure_handler = AzureLogHandler(connection_string=app_insights_conn)
+        azure_handler.setFormatter(formatter)
+        azure_handler.addFilter(_SkipExporterRecords())
+        handlers.append(azure_handler)
+    return handlers
+
+
+def configure_logging():
+    """Install the queue handler and start the listener once per process."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    with _lock:
+        if _listener is not None:
+            return
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        _handler = _NonBlockingQueueHandler(log_queue)
+        logging.getLogger().addHandler(_handler)
+        _listener = QueueListener(log_queue, *_output_handlers(), respect_handler_level=True)
+        _listener.start()
+
+
+@atexit.register
+def shutdown_logging():
+    """Drain the queue and flush App Insights; safe to call more than once."""
+    global _listener, _handler
+    with _lock:
+        if _listener is None:
+            return
+        logging.getLogger().removeHandler(_handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            try:
+                handler.flush()
+                handler.close()
+            except ValueError:
+                pass  # stream already closed at interpreter exit (e.g. captured stdout under pytest)
+        _listener = None
+        _handler = None
+
+
+def _restart_in_child():
+    # A forked child inherits the handler but not the listener thread (or a held lock)
+    global _listener, _handler, _lock
+    _lock = threading.Lock()
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+    _listener = None
+    _handler = None
+    configure_logging()
+
+
+os.register_at_fork(after_in_child=_restart_in_child)
+
+
+def get_logger(name):
+    """Logger for a module, at LOG_LEVEL unless LOG_LEVELS overrides it."""
+    configure_logging()
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVELS.get(name, LOG_LEVEL))
+    return logger
+
+
+def sampled(key):
+    """True for 1 in LOG_SAMPLE_EVERY[key] calls; always True for keys without a setting."""
+    every = LOG_SAMPLE_EVERY.get(key, 1)
+    if every <= 1:
+        return True
+    counter = _sample_counters.get(key)
+    if counter is None:
+        counter = _sample_counters.setdefault(key, itertools.count())
+    return next(counter) % every == 0
+
+
+def get_logging_stats():
+    return {
+        "queued": _handler.queue.qsize() if _handler is not None else 0,
+        "queue_size": LOG_QUEUE_SIZE,
+        "dropped": _dropped,
+        "sample_every": LOG_SAMPLE_EVERY,
+    }
@@ -0,0 +1,249 @@
+import atexit
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from service.job_queue import JOB_QUEUE_DB
+from service.profiling import stage_finished
+
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Observations are buffered per process and merged into the shared store this often (seconds)
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+# Histogram bucket upper bounds (seconds)
+METRICS_BUCKETS = tuple(sorted(float(b) for b in os.getenv(
+    "METRICS_BUCKETS", "0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,120,300,600,1800,3600"
+).split(",")))
+
+STAGE_SECONDS = "pipeline_stage_seconds"
+STAGE_FAILURES = "pipeline_stage_failures_total"
+JOBS = "pipeline_jobs_total"
+
+_METRICS = {
+    STAGE_SECONDS: ("histogram", "Time spent in each pipeline stage"),
+    STAGE_FAILURES: ("counter", "Pipeline stage runs that raised"),
+    JOBS: ("counter", "Finished jobs by status"),
+}
+
+# Audio length buckets for the duration_bucket label
+_DURATION_BUCKETS = ((60, "lt_1m"), (300, "1m_5m"), (900, "5m_15m"), (3600, "15m_60m"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    buckets TEXT,
+    sum REAL NOT NULL DEFAULT 0,
+    count REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, labels)
+);
+"""
+
+_job_labels = contextvars.ContextVar("metric_labels", default=None)
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> [per-bucket counts + overflow, sum, count]
+_counters = {}    # (name, labels) -> value
+_flusher = None
+_initialized = False
+_init_lock = threading.Lock()
+
+
+def duration_bucket(seconds):
+    if seconds is None:
+        return "unknown"
+    for limit, name in _DURATION_BUCKETS:
+        if seconds < limit:
+            return name
+    return "gt_60m"
+
+
+def file_format(file_name):
+    return os.path.splitext(file_name)[1].lstrip(".").lower() or "unknown"
+
+
+@contextlib.contextmanager
+def job_metrics(file_name=None, **labels):
+    """Label every observation made for this job (format from file_name; duration filled in after decode)."""
+    values = {"format": file_format(file_name) if file_name else "unknown", "duration_bucket": "unknown"}
+    values.update(labels)
+    token = _job_labels.set(values)
+    try:
+        yield values
+    finally:
+        _job_labels.reset(token)
+
+
+def update_job_labels(**labels):
+    """Refine the current job's labels, e.g. duration_bucket once the audio length is known."""
+    values = _job_labels.get()
+    if values is not None:
+        values.update(labels)
+
+
+def _key(name, labels):
+    merged = {"format": "unknown", "duration_bucket": "unknown", **(_job_labels.get() or {}), **labels}
+    return name, json.dumps(sorted((k, str(v)) for k, v in merged.items()))
+
+
+def observe(stage, seconds, **labels):
+    """Record one stage duration in the pipeline_stage_seconds histogram."""
+    stage_finished(stage, seconds)
+    if not METRICS_ENABLED:
+        return
+    key = _key(STAGE_SECONDS, {"stage": stage, **labels})
+    with _lock:
+        entry = _histograms.setdefault(key, [[0] * (len(METRICS_BUCKETS) + 1), 0.0, 0])
+        entry[0][bisect.bisect_left(METRICS_BUCKETS, seconds)] += 1
+        entry[1] += seconds
+        entry[2] += 1
+    _ensure_flusher()
+
+
+def inc(name, amount=1, **labels):
+    if not METRICS_ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    _ensure_flusher()
+
+
+@contextlib.contextmanager
+def timed(stage, **labels):
+    """Observe the block's duration as `stage`; failures are also counted."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        inc(STAGE_FAILURES, stage=stage, **labels)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - started, **labels)
+
+
+# ------------------ Shared store ------------------
+
+def _connect():
+    global _initialized
+    connection = sqlite3.connect(JOB_QUEUE_DB, timeout=30, isolation_level=None)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                connection.execute("PRAGMA journal_mode=WAL;")
+                connection.executescript(_SCHEMA)
+                _initialized = True
+    return connection
+
+
+def flush():
+    """Merge this process's buffered observations into the shared store."""
+    global _histograms, _counters
+    with _lock:
+        histograms, counters = _histograms, _counters
+        _histograms, _counters = {}, {}
+    if not histograms and not counters:
+        return
+
+    connection = _connect()
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        for (name, labels), (buckets, total, count) in histograms.items():
+            row = connection.execute(
+                "SELECT buckets, sum, count FROM metrics WHERE name = ? AND labels = ?", (name, labels)
+            ).fetchone()
+            if row is not None:
+                stored = json.loads(row[0])
+                if len(stored) == len(buckets):  # bucket layout unchanged
+                    buckets = [a + b for a, b in zip(stored, buckets)]
+                    total += row[1]
+                    count += row[2]
+            connection.execute(
+                "INSERT OR REPLACE INTO metrics (name, labels, buckets, sum, count) VALUES (?, ?, ?, ?, ?)",
+                (name, labels, json.dumps(buckets), total, count),
+            )
+        for (name, labels), value in counters.items():
+            connection.execute(
+                "INSERT INTO metrics (name, labels, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, labels) DO UPDATE SET count = count + excluded.count",
+                (name, labels, value),
+            )
+        connection.execute("COMMIT")
+    except Exception as e:
+        connection.execute("ROLLBACK")
+        logger.info(f"Dropped {len(histograms) + len(counters)} metric series, flush failed: {e}")
+    finally:
+        connection.close()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.info(f"Metrics flush failed: {e}")
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None:
+        with _lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+                _flusher.start()
+                atexit.register(flush)
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_bound(bound):
+    return f"{bound:g}"
+
+
+def render_prometheus():
+    """All processes' metrics in the Prometheus text exposition format (0.0.4)."""
+    flush()
+    connection = _connect()
+    try:
+        rows = connection.execute(
+            "SELECT name, labels, buckets, sum, count FROM metrics ORDER BY name, labels"
+        ).fetchall()
+    finally:
+        connection.close()
+
+    lines = []
+    seen = set()
+    for name, labels, buckets, total, count in rows:
+        kind, help_text = _METRICS.get(name, ("untyped", name))
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+        labels = json.loads(labels)
+        if kind == "histogram":
+            counts = json.loads(buckets)
+            cumulative = 0
+            for bound, bucket_count in zip(METRICS_BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_bound(bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {int(count)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {int(count)}")
+        else:
+            lines.append(f"{name}{_format_labels(labels)} {count:.17g}")
+    return "\n".join(lines) + "\n"
@@ -1,22 +1,151 @@
 import os
+import threading
+import time
+
 import joblib
+from joblib import Parallel, delayed
 import librosa
 import numpy as np
+import psutil
+
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MODEL_PATH = os.getenv("MAGIC_MODEL_PATH", "model/magic_model.pkl")
+SCALER_PATH = os.getenv("MAGIC_SCALER_PATH", "model/magic_scaler.pkl")
+# Memory-map the model arrays read-only so several workers share the same page-cache pages
+MODEL_MMAP = os.getenv("MAGIC_MODEL_MMAP", "false").lower() == "true"
+# How often (seconds) to check the pickle files for changes; 0 disables hot reload
+MODEL_RELOAD_INTERVAL = float(os.getenv("MAGIC_MODEL_RELOAD_INTERVAL", "30"))
+# Parallel workers for batch feature extraction per call (-1 = all cores). A batch is a few
+# clips and already runs in each of JOB_WORKER_CONCURRENCY processes, so keep this small
+MFCC_N_JOBS = int(os.getenv("MFCC_N_JOBS", "1"))
+
+_model_lock = threading.Lock()
+_model_state = {
+    "svm_classifier": None,
+    "scaler": None,
+    "mtimes": None,
+    "checked_at": 0.0,
+}
+
+
+def _model_mtimes():
+    return os.path.getmtime(MODEL_PATH), os.path.getmtime(SCALER_PATH)
+
 
-def extract_mfcc_features(audio_path, n_mfcc=13, n_fft=2048, hop_length=512):
+def _load_model():
+    start = time.perf_counter()
+    mmap_mode = "r" if MODEL_MMAP else None
+    mtimes = _model_mtimes()
+    svm_classifier = joblib.load(MODEL_PATH, mmap_mode=mmap_mode)
+    scaler = joblib.load(SCALER_PATH, mmap_mode=mmap_mode)
+    elapsed = time.perf_counter() - start
+    rss_mb = psutil.Process().memory_info().rss / (1024 * 1024)
+    logger.info(
+        f"Loaded MAGIC model in {elapsed:.3f}s (mmap={MODEL_MMAP}, pid={os.getpid()}, rss={rss_mb:.1f} MB)"
+    )
+    _model_state.update(svm_classifier=svm_classifier, scaler=scaler, mtimes=mtimes, checked_at=time.monotonic())
+
+
+def get_model():
+    """
+    Return (svm_classifier, scaler), loading them once per process.
+    Reloads when the pickle files change on disk.
+    """
+    with _model_lock:
+        if _model_state["svm_classifier"] is None:
+            _load_model()
+        elif MODEL_RELOAD_INTERVAL > 0 and time.monotonic() - _model_state["checked_at"] >= MODEL_RELOAD_INTERVAL:
+            _model_state["checked_at"] = time.monotonic()
+            try:
+                changed = _model_mtimes() != _model_state["mtimes"]
+            except OSError as e:
+                logger.warning(f"Could not stat model files, keeping loaded model: {e}")
+                changed = False
+            if changed:
+                logger.info("Model files changed on disk, reloading")
+                try:
+                    _load_model()
+                except Exception as e:
+                    logger.warning(f"Model reload failed, keeping previous model: {e}")
+        return _model_state["svm_classifier"], _model_state["scaler"]
+
+
+def extract_mfcc_features(audio_path, n_mfcc=13, n_fft=2048, hop_length=512, offset=0.0, duration=None):
     try:
-        audio_data, sr = librosa.load(audio_path, sr=None)
+        audio_data, sr = librosa.load(audio_path, sr=None, offset=offset, duration=duration)
     except Exception as e:
         print(f"Error loading audio file {audio_path}: {e}")
         return None
 
     mfccs = librosa.feature.mfcc(y=audio_data, sr=sr, n_mfcc=n_mfcc, n_fft=n_fft, hop_length=hop_length)
     return np.mean(mfccs.T, axis=0)
+
+
+def _extract_item_features(item):
+    # item is a file path or a (path, start_seconds, end_seconds) segment; a failure
+    # becomes None (an error entry for this item) instead of failing the whole batch
+    try:
+        if isinstance(item, (tuple, list)):
+            path, start, end = item
+            return extract_mfcc_features(path, offset=start, duration=end - start)
+        return extract_mfcc_features(item)
+    except Exception as e:
+        logger.warning(f"Feature extraction failed for {item}: {e}")
+        return None
+
+
+def analyze_audio_batch(items, n_jobs=None, remove_files=True):
+    """
+    Analyze many clips or segments in one vectorized pass.
+
+    Args:
+        items (list): file paths, or (path, start_seconds, end_seconds) segments
+        n_jobs (int): parallel feature-extraction workers (defaults to MFCC_N_JOBS)
+        remove_files (bool): delete each successfully analyzed file, as analyze_audio does
+
+    Returns:
+        list of dicts, one per item, with "label" ("real"/"fake"/error) and "score"
+        (SVM decision value, positive leaning "fake")
+    """
+    if not items:
+        return []
+
+    svm_classifier, scaler = get_model()
+
+    n_jobs = n_jobs or MFCC_N_JOBS
+    if n_jobs > 0:
+        n_jobs = min(n_jobs, len(items))
+    features = Parallel(n_jobs=n_jobs)(
+        delayed(_extract_item_features)(item) for item in items
+    )
+
+    results = [{"label": "Error: Unable to process the input audio.", "score": None} for _ in items]
+    valid = [i for i, f in enumerate(features) if f is not None]
+    if not valid:
+        return results
+
+    matrix = np.vstack([features[i] for i in valid])
+    scaled = scaler.transform(matrix)
+    predictions = svm_classifier.predict(scaled)
+    scores = svm_classifier.decision_function(scaled)
+
+    for i, prediction, score in zip(valid, predictions, scores):
+        results[i] = {"label": "real" if prediction == 0 else "fake", "score": float(score)}
+
+    if remove_files:
+        done_paths = {items[i] if isinstance(items[i], str) else items[i][0] for i in valid}
+        for path in done_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    return results
+
+
 def analyze_audio(input_audio_path):
-    model_filename = "model/magic_model.pkl"
-    scaler_filename = "model/magic_scaler.pkl"
-    svm_classifier = joblib.load(model_filename)
-    scaler = joblib.load(scaler_filename)
+    svm_classifier, scaler = get_model()
 
     if not os.path.exists(input_audio_path):
         print("Error: The specified file does not exist.")
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import time
+
+import azure.cognitiveservices.speech as speechsdk
+from pydub import AudioSegment
+from pydub.utils import mediainfo
+
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# What the Speech service transcribes; the pipe is resampled to this by ffmpeg
+SPEECH_SAMPLE_RATE = 16000
+SPEECH_SAMPLE_WIDTH = 2
+SPEECH_CHANNELS = 1
+
+
+def probe_duration(input_path):
+    """Duration in seconds from the container header (ffprobe), or None if it can't be read."""
+    try:
+        return float(mediainfo(input_path)["duration"])
+    except Exception:
+        return None
+
+
+class FfmpegPcmStream(speechsdk.audio.PullAudioInputStreamCallback):
+    """
+    16 kHz mono PCM read straight from an ffmpeg pipe into the Speech SDK.
+
+    The SDK pulls from the pipe as it transcribes, so transcription starts on the
+    first decoded frames, memory stays at the pipe buffer size and nothing is
+    written to disk. The stream can be read once; make a new one per attempt.
+    """
+
+    frame_rate = SPEECH_SAMPLE_RATE
+    frame_width = SPEECH_SAMPLE_WIDTH * SPEECH_CHANNELS
+
+    def __init__(self, input_path):
+        super().__init__()
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"File not found: {input_path}")
+        self.input_path = input_path
+        self.bytes_read = 0
+        self.first_read_seconds = None
+        self._started = time.perf_counter()
+        self._process = subprocess.Popen(
+            [AudioSegment.converter, "-nostdin", "-loglevel", "error", "-i", input_path,
+             "-f", "s16le", "-acodec", "pcm_s16le",
+             "-ac", str(SPEECH_CHANNELS), "-ar", str(SPEECH_SAMPLE_RATE), "pipe:1"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+
+    def read(self, buffer: memoryview) -> int:
+        # Returning 0 tells the SDK the stream has ended
+        n = self._process.stdout.readinto(buffer) or 0
+        if n and self.first_read_seconds is None:
+            self.first_read_seconds = time.perf_counter() - self._started
+            logger.info(f"First PCM frames from ffmpeg for {self.input_path} after {self.first_read_seconds:.2f}s")
+        self.bytes_read += n
+        return n
+
+    def close(self):
+        pass
+
+    def frame_count(self):
+        """Frames handed to the SDK so far; recognized offsets can't be past this."""
+        return self.bytes_read // self.frame_width
+
+    def audio_config(self):
+        stream_format = speechsdk.audio.AudioStreamFormat(
+            samples_per_second=SPEECH_SAMPLE_RATE,
+            bits_per_sample=SPEECH_SAMPLE_WIDTH * 8,
+            channels=SPEECH_CHANNELS,
+        )
+        stream = speechsdk.audio.PullAudioInputStream(pull_stream_callback=self, stream_format=stream_format)
+        return speechsdk.audio.AudioConfig(stream=stream)
+
+    def finish(self, check=True):
+        """Stop ffmpeg if the SDK stopped reading early; raise if the decode itself failed."""
+        stopped_early = self._process.poll() is None
+        if stopped_early:
+            self._process.kill()
+        _, stderr = self._process.communicate()
+        seconds = self.frame_count() / self.frame_rate
+        logger.info(f"Streamed {seconds:.1f}s of PCM for {self.input_path} "
+                    f"in {time.perf_counter() - self._started:.2f}s")
+        if check and not stopped_early and self._process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed for {self.input_path}: {stderr.decode(errors='replace').strip()}")
@@ -1,34 +1,30 @@
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv, find_dotenv
 import psycopg2
 import json
 
-from service.db_service import connect_to_db
+from service.db_service import get_db_connection
+from service.process_result_resemble import apply_result, lock_uuid, reconcile_pending, stored_metrics
+from service.result_cache import link_cached_result, lookup, pipeline_config_key, remember
 from service.resemble_detection_service import analyze_audio, analyze_result
+from service.resilience import bind_job_context, job_deadline
+from service.job_queue import LeaseLost, enter_stage
+from service.metrics import timed
 from service.speech_service import recognize_from_file
 import traceback
-import logging
-import sys
-
-from opencensus.ext.azure.log_exporter import AzureLogHandler
+from service.logging_config import get_logger
 load_dotenv(find_dotenv())
 
-# Create logger
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# Always log to console (local + Azure Log Stream)
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-logger.addHandler(console_handler)
+logger = get_logger(__name__)
 
-# Add Azure Application Insights handler only if connection string is present
-app_insights_conn = os.getenv("APP_INSIGHTS_CONNECTION_STRING")
-if app_insights_conn:
-    azure_handler = AzureLogHandler(connection_string=app_insights_conn)
-    azure_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-    logger.addHandler(azure_handler)
+# Max speakers detected/stored in parallel per file
+SPEAKER_CONCURRENCY = int(os.getenv("SPEAKER_CONCURRENCY", "8"))
+# Without a callback URL the only way to get results is to wait (and poll) for them
+RESEMBLE_WAIT_FOR_RESULTS = os.getenv(
+    "RESEMBLE_WAIT_FOR_RESULTS", "false" if os.getenv("RESEMBLE_CALLBACK_URL") else "true"
+).lower() == "true"
 
 # def process_audio(file_path):
 #     file_name = os.path.basename(file_path)   # original filename
@@ -204,94 +200,186 @@ if app_insights_conn:
 #     return response
 #     # return test_tuple
 
-def process_audio(file_path):
+def _process_speaker(speaker, url, transcriptions, file_name, file_id, original_file, content_hash, config_key,
+                     wait_for_results=True, submitted=None):
+    """
+    Submit, store and return the segments for one speaker.
+    Runs on the speaker pool; errors propagate to the caller for isolation.
+    `submitted` is a future for a Resemble submission already started during transcription.
+    """
+    # Call second function to get uuid
+    file_uuid = submitted.result() if submitted is not None else analyze_audio(url)
+
+    # Collect all transcription segments for this speaker
+    speaker_transcripts = [
+        {"text": text, "start": start, "end": end}
+        for spk, text, start, end in transcriptions if spk == speaker
+    ]
+
+    # Step 3: Store in PostgreSQL right away, so the callback always finds its row
+    try:
+        insert_query = """
+            INSERT INTO audio_data (
+                speaker_name, file_url, file_uuid,
+                transcriptions, file_name, file_id, original_file_url,
+                content_hash, pipeline_config
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id;
+        """
+
+        enter_stage("db_write", verify=True)  # only the worker holding the job writes its rows
+        with timed("db_write"), get_db_connection() as (cur, conn):
+            lock_uuid(cur, file_uuid)  # a concurrent callback either sees this row or is reconciled below
+            cur.execute(insert_query, (
+                speaker,
+                url,
+                file_uuid,
+                json.dumps(speaker_transcripts),
+                file_name,
+                file_id,
+                original_file,
+                content_hash,
+                config_key
+            ))
+            # A fast callback may already be waiting in the pending store
+            result = reconcile_pending(cur, file_uuid)
+            conn.commit()
+
+    except Exception as db_err:
+        logger.info(f"Database error: {db_err}")
+        logger.info(traceback.format_exc())
+        raise
+
+    # Step 4: Wait for the detection (callback first, polling as fallback) unless the callback will fill it in
+    if result is None and wait_for_results:
+        enter_stage("resemble_wait")
+        result = analyze_result(file_uuid, stored=stored_metrics)
+        try:
+            with timed("db_write"), get_db_connection() as (cur, conn):
+                apply_result(cur, file_uuid, result)
+                conn.commit()
+        except Exception as db_err:
+            logger.info(f"Database error: {db_err}")
+            logger.info(traceback.format_exc())
+            raise
+
+    result = result or {}
+    return [
+        {
+            "start": t["start"],
+            "end": t["end"],
+            "text": t["text"],
+            "metrics": {
+                "label": result.get("analysis_label"),
+                "score": result.get("analysis_scores"),
+                "consistency": result.get("consistency"),
+                "aggregated_score": result.get("aggregated_score")
+            }
+        }
+        for t in speaker_transcripts
+    ]
+
+
+def _response_from_cached_rows(response, rows):
+    for row in rows:
+        response["file_url"] = row["original_file_url"]
+        for t in row["transcriptions"]:
+            response["segments"].append({
+                "start": t["start"],
+                "end": t["end"],
+                "text": t["text"],
+                "metrics": {
+                    "label": row["analysis_label"],
+                    "score": row["analysis_scores"],
+                    "consistency": row["consistency"],
+                    "aggregated_score": row["aggregated_score"]
+                }
+            })
+    return response
+
+
+@job_deadline()
+def process_audio(file_path, content_hash=None, wait_for_results=None):
+    """
+    Transcribe, split by speaker, submit each speaker to Resemble and store the rows.
+    Every external call made for the job shares one JOB_DEADLINE_SECONDS deadline.
+
+    wait_for_results: block until every speaker has its metrics (needed to return them).
+    Defaults to RESEMBLE_WAIT_FOR_RESULTS; when false the /resemble-callback fills the rows in.
+    """
+    if wait_for_results is None:
+        wait_for_results = RESEMBLE_WAIT_FOR_RESULTS
     response = {
         "file_name": os.path.basename(file_path),
         "file_id": str(uuid.uuid4()),
         "file_url": None,   # will be set from original file
         "segments": []      # <-- flat list of all speaker segments
     }
-
+    config_key = pipeline_config_key()
+
+    # Step 0: Identical audio already processed with this config? Reuse it without external calls
+    if content_hash:
+        try:
+            cached_file_id = lookup(content_hash)
+            if cached_file_id:
+                logger.info(f"♻️ Cache hit for {response['file_name']} (sha256={content_hash})")
+                rows = link_cached_result(cached_file_id, response["file_name"], response["file_id"])
+                if rows:
+                    return _response_from_cached_rows(response, rows)
+        except Exception as cache_err:
+            logger.info(f"Result cache lookup failed, processing normally: {cache_err}")
+
+    speaker_errors = 0
     try:
-        # Step 1: Get transcriptions and uploaded files
-        transcriptions, uploaded_files, original_file = recognize_from_file(file_path)
+        # Step 1: Get transcriptions and uploaded files.
+        # Each clip is submitted to Resemble the moment it is uploaded, which in
+        # streaming mode is while the rest of the file is still being transcribed.
+        submitted = {}
+
+        def _submit_clip(speaker, url):
+            submitted[speaker] = submit_executor.submit(bind_job_context(analyze_audio), url)
+
+        enter_stage("transcription")
+        with ThreadPoolExecutor(max_workers=max(1, SPEAKER_CONCURRENCY)) as submit_executor:
+            transcriptions, uploaded_files, original_file = recognize_from_file(
+                file_path, on_clip_uploaded=_submit_clip
+            )
         response["file_url"] = original_file  # set once
 
-        # Step 2: Process each speaker
-        for speaker, url in uploaded_files.items():
-            try:
-                # Call second function to get uuid
-                file_uuid = analyze_audio(url)
-                result = analyze_result(file_uuid)  
-                analysis_label = result.get("analysis_label")
-                analysis_scores = result.get("analysis_scores")
-                consistency = result.get("consistency")
-                aggregated_score = result.get("aggregated_score")
-
-                # Collect all transcription segments for this speaker
-                speaker_transcripts = [
-                    {"text": text, "start": start, "end": end}
-                    for spk, text, start, end in transcriptions if spk == speaker
-                ]
-
-                # Step 3: Store in PostgreSQL
-                cur, conn = connect_to_db()
+        # Step 2: Submit every speaker at once and wait for them together
+        enter_stage("resemble_submit")
+        speakers = list(uploaded_files.items())
+        with ThreadPoolExecutor(max_workers=max(1, min(SPEAKER_CONCURRENCY, len(speakers) or 1))) as executor:
+            futures = [
+                executor.submit(
+                    bind_job_context(_process_speaker), speaker, url, transcriptions,
+                    response["file_name"], response["file_id"], original_file, content_hash, config_key,
+                    wait_for_results, submitted.get(speaker)
+                )
+                for speaker, url in speakers
+            ]
+
+            # Collect in speaker order so the response layout is unchanged
+            for (speaker, _), future in zip(speakers, futures):
                 try:
-                    insert_query = """
-                        INSERT INTO audio_data (
-                            speaker_name, file_url, file_uuid,
-                            transcriptions, file_name, file_id, original_file_url,
-                            analysis_label, analysis_scores, consistency, aggregated_score
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id;
-                    """
-
-                    cur.execute(insert_query, (
-                        speaker,
-                        url,
-                        file_uuid,
-                        json.dumps(speaker_transcripts),
-                        response["file_name"],
-                        response["file_id"],
-                        original_file,
-                        analysis_label,
-                        json.dumps(analysis_scores),
-                        consistency,
-                        aggregated_score
-                    ))
-                    conn.commit()
-                    cur.close()
-                    conn.close()
-
-                except Exception as db_err:
-                    conn.rollback()
-                    logger.info(f"Database error: {db_err}")
-                    logger.info(traceback.format_exc())
+                    # Append this speaker’s segments into one flat list
+                    response["segments"].extend(future.result())
+                except LeaseLost:
                     raise
-
-                # Append this speaker’s segments into one flat list
-                for t in speaker_transcripts:
-                    response["segments"].append({
-                        "start": t["start"],
-                        "end": t["end"],
-                        "text": t["text"],
-                        "metrics": {
-                            "label": analysis_label,
-                            "score": analysis_scores,
-                            "consistency": consistency,
-                            "aggregated_score": aggregated_score
-                        }
-                    })
-
-            except Exception as speaker_err:
-                logger.info(f"Error processing speaker {speaker}: {speaker_err}")
-                logger.info(traceback.format_exc())
-                continue  # move on to next speaker
+                except Exception as speaker_err:
+                    speaker_errors += 1
+                    logger.info(f"Error processing speaker {speaker}: {speaker_err}")
+                    logger.info("".join(traceback.format_exception(speaker_err)))
+                    continue  # move on to next speaker
 
     except Exception as main_err:
         logger.info(f"Fatal error in process_audio: {main_err}")
         logger.info(traceback.format_exc())
         raise
 
+    # Only complete results are worth reusing
+    if content_hash and wait_for_results and response["segments"] and not speaker_errors:
+        remember(content_hash, response["file_id"])
+
     return response
@@ -1,6 +1,6 @@
 import traceback
 
-from service.ml_detection_service import analyze_audio
+from service.ml_detection_service import analyze_audio_batch
 from service.speech_service import recognize_from_file
 
 def process_audio(file_path: str):
@@ -15,16 +15,19 @@ def process_audio(file_path: str):
         # Step 1: Get transcriptions + saved audio files per speaker
         transcriptions, saved_files = recognize_from_file(file_path)
 
-        # Step 2: Run analysis ONCE per speaker file
+        # Step 2: Run analysis ONCE per speaker file, all speakers in one batch
         analysis_results = {}
-        for speaker, file in saved_files.items():
-            if speaker != "Unknown":
-                try:
-                    analysis_results[speaker] = analyze_audio(file)
-                except Exception as e:
-                    analysis_results[speaker] = f"Error analyzing audio: {str(e)}"
-            else:
+        speakers = [speaker for speaker in saved_files if speaker != "Unknown"]
+        for speaker in saved_files:
+            if speaker == "Unknown":
                 analysis_results[speaker] = "Not applicable"
+        try:
+            batch = analyze_audio_batch([saved_files[speaker] for speaker in speakers])
+            for speaker, result in zip(speakers, batch):
+                analysis_results[speaker] = result["label"]
+        except Exception as e:
+            for speaker in speakers:
+                analysis_results[speaker] = f"Error analyzing audio: {str(e)}"
 
         # Step 3: Build response JSON
         response = {
@@ -1,48 +1,173 @@
 import json
-from psycopg2 import sql
+import threading
+from datetime import datetime
+
+from service.db_service import get_db_connection
+from service.resemble_completion import RESEMBLE_RESULT_TIMEOUT
+from service.resemble_detection_service import extract_metrics
+from service.metrics import observe, timed
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_stats_lock = threading.Lock()
+_callback_stats = {
+    "applied": 0,      # callback updated its row directly
+    "orphaned": 0,     # no row yet, buffered in resemble_pending_callbacks
+    "reconciled": 0,   # buffered callback applied when its row was inserted
+    "late": 0,         # arrived after the job's result deadline (RESEMBLE_RESULT_TIMEOUT)
+    "duplicate": 0,    # row already had results, or UUID already buffered
+}
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _callback_stats[name] += n
+
+
+def _result_params(result: dict):
+    # Convert scores list to JSON string for JSONB column
+    return (
+        result.get("analysis_label"),
+        json.dumps(result.get("analysis_scores", [])),
+        result.get("consistency"),
+        result.get("aggregated_score"),
+    )
+
+
+def apply_result(cur, file_uuid: str, result: dict, only_pending=False):
+    """
+    Write an analysis result (see extract_metrics) onto the rows for file_uuid
+    using an open cursor. Returns the created_at of each updated row.
+    """
+    update_query = """
+        UPDATE audio_data
+        SET
+            analysis_label = %s,
+            analysis_scores = %s,
+            consistency = %s,
+            aggregated_score = %s
+        WHERE file_uuid = %s
+    """
+    if only_pending:
+        update_query += " AND analysis_label IS NULL"
+    update_query += " RETURNING created_at;"
+
+    cur.execute(update_query, (*_result_params(result), file_uuid))
+    return [row[0] for row in cur.fetchall()]
+
+
+def stored_metrics(file_uuid: str):
+    """
+    Metrics a callback already wrote onto the rows for file_uuid (from any process),
+    in callback payload form; None while they have no result.
+    """
+    with get_db_connection() as (cur, conn):
+        cur.execute(
+            """
+            SELECT analysis_label, analysis_scores, consistency, aggregated_score
+            FROM audio_data
+            WHERE file_uuid = %s AND analysis_label IS NOT NULL
+            LIMIT 1;
+            """,
+            (file_uuid,)
+        )
+        row = cur.fetchone()
+    if row is None:
+        return None
+    return {"label": row[0], "score": row[1], "consistency": row[2], "aggregated_score": row[3]}
+
+
+def lock_uuid(cur, file_uuid: str):
+    """
+    Serialize the row insert and its callback for one UUID until the transaction ends.
+    Without it, a callback racing an uncommitted insert buffers its result where the
+    inserting transaction's reconcile_pending cannot see it.
+    """
+    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (file_uuid,))
+
+
+def reconcile_pending(cur, file_uuid: str):
+    """
+    Apply a callback that arrived before the row existed. Call in the same
+    transaction that inserts the row, after lock_uuid. Returns the result applied, or None.
+    """
+    cur.execute(
+        "DELETE FROM resemble_pending_callbacks WHERE file_uuid = %s RETURNING metrics;",
+        (file_uuid,)
+    )
+    row = cur.fetchone()
+    if row is None:
+        return None
+    result = extract_metrics(row[0])
+    apply_result(cur, file_uuid, result)
+    _count("reconciled")
+    logger.info(f"🔁 Applied buffered callback for UUID: {file_uuid}")
+    return result
 
-from service.db_service import connect_to_db
 
 def update_audio_data(file_uuid: str, metrics: dict):
     """
     Update the audio_data table with analysis results.
+    Callbacks for UUIDs without a row yet are buffered until the row is inserted.
 
     Args:
         file_uuid (str): UUID of the audio file
         metrics (dict): metrics dict from callback
     """
-    # Extract values from metrics
-    analysis_label = metrics.get("label")
-    analysis_scores = metrics.get("score", [])
-    consistency = metrics.get("consistency")
-    aggregated_score = metrics.get("aggregated_score")
+    try:
+        with timed("db_write"), get_db_connection() as (cur, conn):
+            lock_uuid(cur, file_uuid)
+            updated = apply_result(cur, file_uuid, extract_metrics(metrics), only_pending=True)
 
-    # Convert scores list to JSON string for JSONB column
-    analysis_scores_json = json.dumps(analysis_scores)
+            if updated:
+                _count("applied")
+                # Callback lag: time from the row's insert at submit time to its result arriving
+                lags = [
+                    (datetime.now(created_at.tzinfo) - created_at).total_seconds()
+                    for created_at in updated if created_at is not None
+                ]
+                for lag in lags:
+                    observe("callback_lag", lag)
+                if any(lag > RESEMBLE_RESULT_TIMEOUT for lag in lags):
+                    _count("late")
+                conn.commit()
+                logger.info(f"✅ Updated audio_data for UUID: {file_uuid}")
+                return
 
-    # Get DB connection and cursor
-    cur, conn = connect_to_db()  # your existing function
+            cur.execute("SELECT 1 FROM audio_data WHERE file_uuid = %s LIMIT 1;", (file_uuid,))
+            if cur.fetchone():
+                _count("duplicate")
+                return
 
-    try:
-        update_query = """
-            UPDATE audio_data
-            SET
-                analysis_label = %s,
-                analysis_scores = %s,
-                consistency = %s,
-                aggregated_score = %s
-            WHERE file_uuid = %s;
-        """
+            cur.execute(
+                """
+                INSERT INTO resemble_pending_callbacks (file_uuid, metrics)
+                VALUES (%s, %s)
+                ON CONFLICT (file_uuid) DO NOTHING
+                RETURNING file_uuid;
+                """,
+                (file_uuid, json.dumps(metrics))
+            )
+            buffered = cur.fetchone() is not None
+            conn.commit()
+        if buffered:
+            _count("orphaned")
+            logger.info(f"⏳ Buffered callback for unknown UUID: {file_uuid}")
+        else:
+            _count("duplicate")
+    except Exception:
+        logger.exception(f"❌ Failed to update audio_data for UUID {file_uuid}")
 
-        cur.execute(
-            update_query,
-            (analysis_label, analysis_scores_json, consistency, aggregated_score, file_uuid)
-        )
-        conn.commit()
-        print(f"✅ Updated audio_data for UUID: {file_uuid}")
-    except Exception as e:
-        conn.rollback()
-        print(f"❌ Failed to update audio_data for UUID {file_uuid}: {e}")
-    finally:
-        cur.close()
-        conn.close()
+def get_callback_stats():
+    """Callback reconciliation counters for this process, plus callbacks still buffered."""
+    with _stats_lock:
+        stats = dict(_callback_stats)
+    try:
+        with get_db_connection() as (cur, conn):
+            cur.execute("SELECT COUNT(*) FROM resemble_pending_callbacks;")
+            stats["pending"] = cur.fetchone()[0]
+    except Exception:
+        stats["pending"] = None
+        logger.exception("❌ Failed to count pending callbacks")
+    return stats
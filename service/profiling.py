@@ -0,0 +1,227 @@
+import contextlib
+import contextvars
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import psutil
+
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Profile every job (true) or only those requested with the X-Profile-Job header (false)
+PROFILE_JOBS = os.getenv("PROFILE_JOBS", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.getenv("UPLOAD_ROOT", tempfile.gettempdir()), "profiles"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.01"))  # seconds between stack samples
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "10"))
+PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "20"))
+PROFILE_RETENTION_SECONDS = float(os.getenv("PROFILE_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+PROFILE_HEADER = "X-Profile-Job"
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+_active = contextvars.ContextVar("job_profiler", default=None)
+_process_lock = threading.Lock()  # one profile per process at a time; the sampler sees every thread
+
+
+def _mb(n):
+    return round(n / (1024 * 1024), 1)
+
+
+class JobProfiler:
+    """
+    Sampling CPU profile (collapsed stacks of every thread) plus RSS and tracemalloc
+    samples, attributed to pipeline stages as they finish.
+    """
+
+    def __init__(self, profile_id):
+        self.profile_id = profile_id
+        self.stacks = Counter()
+        self.samples = []   # (monotonic time, rss bytes, traced bytes)
+        self.stages = []    # (stage, start, end, top allocations or None)
+        self._snapshotted = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = psutil.Process()
+        self._started_tracemalloc = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self.started = time.monotonic()
+        self.cpu_started = self._process.cpu_times()
+        self._thread = threading.Thread(target=self._sample_loop, name="job-profiler", daemon=True)
+        self._thread.start()
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(PROFILE_SAMPLE_INTERVAL):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples.append((time.monotonic(), self._process.memory_info().rss, tracemalloc.get_traced_memory()[0]))
+
+    def stage_finished(self, stage, seconds):
+        """Called when a stage is observed; the first run of each stage also gets a tracemalloc snapshot."""
+        end = time.monotonic()
+        top = None
+        if stage not in self._snapshotted and tracemalloc.is_tracing():
+            self._snapshotted.add(stage)
+            statistics = tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP_ALLOCATIONS]
+            top = [{"where": str(stat.traceback[0]), "size_mb": _mb(stat.size), "count": stat.count}
+                   for stat in statistics]
+        self.stages.append((stage, end - seconds, end, top))
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.ended = time.monotonic()
+        self.cpu_ended = self._process.cpu_times()
+        self.traced_peak = tracemalloc.get_traced_memory()[1]
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def _window_peaks(self, start, end):
+        window = [(rss, traced) for at, rss, traced in self.samples if start <= at <= end]
+        if not window:
+            return None, None
+        return _mb(max(rss for rss, _ in window)), _mb(max(traced for _, traced in window))
+
+    def summary(self, error=None):
+        stages = []
+        for stage, start, end, top in self.stages:
+            peak_rss, peak_traced = self._window_peaks(start, end)
+            entry = {
+                "stage": stage,
+                "start_seconds": round(start - self.started, 3),
+                "duration_seconds": round(end - start, 3),
+                "peak_rss_mb": peak_rss,
+                "peak_traced_mb": peak_traced,
+            }
+            if top is not None:
+                entry["top_allocations"] = top
+            stages.append(entry)
+        return {
+            "profile_id": self.profile_id,
+            "pid": os.getpid(),
+            "wall_seconds": round(self.ended - self.started, 3),
+            "cpu_user_seconds": round(self.cpu_ended.user - self.cpu_started.user, 3),
+            "cpu_system_seconds": round(self.cpu_ended.system - self.cpu_started.system, 3),
+            "peak_rss_mb": _mb(max((rss for _, rss, _ in self.samples), default=self._process.memory_info().rss)),
+            "peak_traced_mb": _mb(self.traced_peak),
+            "sample_interval_seconds": PROFILE_SAMPLE_INTERVAL,
+            "cpu_samples": sum(self.stacks.values()),
+            "error": error,
+            "stages": stages,
+        }
+
+    def write(self, error=None):
+        directory = os.path.join(PROFILE_DIR, self.profile_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "summary.json"), "w") as f:
+            json.dump(self.summary(error), f, indent=2)
+        # Collapsed stacks: feed to flamegraph.pl or speedscope
+        with open(os.path.join(directory, "cpu.folded"), "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return directory
+
+
+def _write_skipped(profile_id, reason):
+    """Stub summary, so a profile id handed to the client never 404s without an explanation."""
+    directory = os.path.join(PROFILE_DIR, profile_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "summary.json"), "w") as f:
+        json.dump({"profile_id": profile_id, "pid": os.getpid(), "skipped": reason, "stages": []}, f, indent=2)
+    return directory
+
+
+def _prune():
+    cutoff = time.time() - PROFILE_RETENTION_SECONDS
+    for name in os.listdir(PROFILE_DIR):
+        path = os.path.join(PROFILE_DIR, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def profile_job(profile_id, enabled=False):
+    """
+    Profile the block when requested or PROFILE_JOBS is set. Artifacts are written to
+    PROFILE_DIR/<profile_id>/ even if the job fails; a profile skipped because another
+    one is running gets a summary.json with only the "skipped" reason.
+    """
+    if not (enabled or PROFILE_JOBS):
+        yield None
+        return
+    if not _process_lock.acquire(blocking=False):
+        reason = "another profile was running in this process"
+        logger.info(f"Skipping profile {profile_id}: {reason}")
+        try:
+            _write_skipped(profile_id, reason)
+        except Exception as e:
+            logger.info(f"Failed to write profile {profile_id}: {e}")
+        yield None
+        return
+
+    profiler = JobProfiler(profile_id)
+    token = _active.set(profiler)
+    error = None
+    profiler.start()
+    try:
+        yield profiler
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        profiler.stop()
+        _active.reset(token)
+        _process_lock.release()
+        try:
+            directory = profiler.write(error)
+            _prune()
+            logger.info(f"Profile {profile_id} written to {directory}")
+        except Exception as e:
+            logger.info(f"Failed to write profile {profile_id}: {e}")
+
+
+def stage_finished(stage, seconds):
+    profiler = _active.get()
+    if profiler is not None:
+        profiler.stage_finished(stage, seconds)
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR)):
+        path = os.path.join(PROFILE_DIR, name, "summary.json")
+        if os.path.exists(path):
+            profiles.append({"profile_id": name, "created_at": os.path.getmtime(path)})
+    return profiles
+
+
+def profile_artifact(profile_id, artifact):
+    """Path of summary.json / cpu.folded for a profile, or None if it does not exist."""
+    if not _PROFILE_ID.match(profile_id) or artifact not in ("summary.json", "cpu.folded"):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id, artifact)
+    return path if os.path.exists(path) else None
@@ -0,0 +1,309 @@
+import asyncio
+import contextlib
+import email.utils
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from service.job_queue import JOB_QUEUE_DB
+from service.resilience import remaining
+
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Client-side limits, shared by every process using JOB_QUEUE_DB (off = no throttling)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Token bucket (requests per second, burst; rate 0 = no rate limit) and the ceiling of the AIMD concurrency window
+RESEMBLE_RATE_LIMIT = float(os.getenv("RESEMBLE_RATE_LIMIT", "10"))
+RESEMBLE_RATE_BURST = float(os.getenv("RESEMBLE_RATE_BURST", "20"))
+RESEMBLE_MAX_IN_FLIGHT = float(os.getenv("RESEMBLE_MAX_IN_FLIGHT", "32"))
+SPEECH_RATE_LIMIT = float(os.getenv("SPEECH_RATE_LIMIT", "2"))  # new transcription sessions per second
+SPEECH_RATE_BURST = float(os.getenv("SPEECH_RATE_BURST", "5"))
+SPEECH_MAX_IN_FLIGHT = float(os.getenv("SPEECH_MAX_IN_FLIGHT", "20"))  # concurrent sessions
+# AIMD: start at this many slots and add one per success until the first 429/503, then +1 slot
+# per window of successes; on 429/503 multiply by this, at most once per interval
+RATE_LIMIT_INITIAL_WINDOW = float(os.getenv("RATE_LIMIT_INITIAL_WINDOW", "4"))
+RATE_LIMIT_DECREASE_FACTOR = float(os.getenv("RATE_LIMIT_DECREASE_FACTOR", "0.5"))
+RATE_LIMIT_DECREASE_INTERVAL = float(os.getenv("RATE_LIMIT_DECREASE_INTERVAL", "1"))
+# A slot held by a crashed process is freed after this long
+RATE_LIMIT_LEASE_SECONDS = float(os.getenv("RATE_LIMIT_LEASE_SECONDS", "120"))
+RATE_LIMIT_POLL_INTERVAL = float(os.getenv("RATE_LIMIT_POLL_INTERVAL", "0.05"))
+
+_LIMITS = {
+    "resemble": (RESEMBLE_RATE_LIMIT, RESEMBLE_RATE_BURST, RESEMBLE_MAX_IN_FLIGHT),
+    "speech": (SPEECH_RATE_LIMIT, SPEECH_RATE_BURST, SPEECH_MAX_IN_FLIGHT),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    refilled_at REAL NOT NULL,
+    concurrency_window REAL NOT NULL,
+    decreased_at REAL NOT NULL DEFAULT 0,
+    blocked_until REAL NOT NULL DEFAULT 0,
+    granted INTEGER NOT NULL DEFAULT 0,
+    throttled INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rate_limit_leases (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rate_limit_leases_name ON rate_limit_leases (name, expires_at);
+"""
+
+_initialized = False
+_init_lock = threading.Lock()
+
+
+class ThrottledError(RuntimeError):
+    """The dependency rejected the call for quota reasons (HTTP 429 or equivalent)."""
+    status_code = 429
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _connect():
+    global _initialized
+    connection = sqlite3.connect(JOB_QUEUE_DB, timeout=30, isolation_level=None)
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                connection.execute("PRAGMA journal_mode=WAL;")
+                connection.executescript(_SCHEMA)
+                _initialized = True
+    return connection
+
+
+@contextlib.contextmanager
+def _transaction():
+    connection = _connect()
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+    finally:
+        connection.close()
+
+
+def parse_retry_after(value):
+    """Retry-After header (seconds or HTTP date) -> seconds, or None."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _state(connection, name, now):
+    """(stored, tokens, window, blocked_until, in_flight) for `name` as of now."""
+    rate, burst, max_window = _LIMITS[name]
+    row = connection.execute(
+        "SELECT tokens, refilled_at, concurrency_window, blocked_until FROM rate_limits WHERE name = ?", (name,)
+    ).fetchone()
+    stored = row is not None
+    if not stored:
+        row = (burst, now, min(max_window, max(1.0, RATE_LIMIT_INITIAL_WINDOW)), 0.0)
+    tokens, refilled_at, window, blocked_until = row
+    if rate > 0:
+        tokens = min(burst, tokens + max(0.0, now - refilled_at) * rate)
+    in_flight = connection.execute(
+        "SELECT COUNT(*) FROM rate_limit_leases WHERE name = ? AND expires_at > ?", (name, now)
+    ).fetchone()[0]
+    return stored, tokens, window, blocked_until, in_flight
+
+
+def _wait_for(name, tokens, window, blocked_until, in_flight, now):
+    """Seconds until a slot may be free, or 0 if one can be taken now."""
+    rate = _LIMITS[name][0]
+    if now < blocked_until:
+        return blocked_until - now  # Retry-After from the dependency applies to every process
+    if in_flight >= max(1, int(window)):
+        return RATE_LIMIT_POLL_INTERVAL
+    if rate > 0 and tokens < 1:
+        return (1 - tokens) / rate
+    return 0.0
+
+
+def _try_acquire(name, lease_seconds):
+    """Take a slot if the bucket and window allow it: (lease_id, None) or (None, seconds to wait)."""
+    # Waiting is decided from a plain read; the write lock is only taken to consume a token
+    connection = _connect()
+    try:
+        now = time.time()
+        wait = _wait_for(name, *_state(connection, name, now)[1:], now)
+    finally:
+        connection.close()
+    if wait > 0:
+        return None, wait
+
+    with _transaction() as connection:
+        now = time.time()
+        stored, tokens, window, blocked_until, in_flight = _state(connection, name, now)
+        wait = _wait_for(name, tokens, window, blocked_until, in_flight, now)
+        if wait > 0:
+            return None, wait  # another process took the slot in between
+
+        if _LIMITS[name][0] > 0:
+            tokens -= 1
+        if stored:
+            connection.execute(
+                "UPDATE rate_limits SET tokens = ?, refilled_at = ? WHERE name = ?", (tokens, now, name)
+            )
+        else:
+            connection.execute(
+                "INSERT INTO rate_limits (name, tokens, refilled_at, concurrency_window) VALUES (?, ?, ?, ?)",
+                (name, tokens, now, window),
+            )
+        connection.execute("DELETE FROM rate_limit_leases WHERE name = ? AND expires_at <= ?", (name, now))
+        lease_id = uuid.uuid4().hex
+        connection.execute(
+            "INSERT INTO rate_limit_leases (id, name, expires_at) VALUES (?, ?, ?)",
+            (lease_id, name, now + lease_seconds),
+        )
+    return lease_id, None
+
+
+def _release(name, lease_id, outcome, retry_after):
+    _, _, max_window = _LIMITS[name]
+    now = time.time()
+    with _transaction() as connection:
+        connection.execute("DELETE FROM rate_limit_leases WHERE id = ?", (lease_id,))
+        if outcome == "ok":
+            # Slow start (one slot per success) until the first decrease, then additive increase:
+            # about one more slot per window's worth of successes
+            connection.execute(
+                "UPDATE rate_limits SET concurrency_window = MIN(?, concurrency_window + "
+                "CASE WHEN decreased_at = 0 THEN 1.0 ELSE 1.0 / concurrency_window END), "
+                "granted = granted + 1 WHERE name = ?",
+                (max_window, name),
+            )
+        elif outcome == "throttled":
+            # Multiplicative decrease (once per interval, not once per queued 429), empty the bucket
+            connection.execute(
+                "UPDATE rate_limits SET "
+                "concurrency_window = CASE WHEN ? - decreased_at >= ? "
+                "THEN MAX(1.0, concurrency_window * ?) ELSE concurrency_window END, "
+                "decreased_at = CASE WHEN ? - decreased_at >= ? THEN ? ELSE decreased_at END, "
+                "blocked_until = MAX(blocked_until, ?), tokens = 0, refilled_at = ?, throttled = throttled + 1 "
+                "WHERE name = ?",
+                (now, RATE_LIMIT_DECREASE_INTERVAL, RATE_LIMIT_DECREASE_FACTOR,
+                 now, RATE_LIMIT_DECREASE_INTERVAL, now,
+                 now + (retry_after or 0.0), now, name),
+            )
+
+
+class Permit:
+    """One granted slot; report how the call went so the window can adapt."""
+
+    def __init__(self, name, lease_id):
+        self.name = name
+        self.lease_id = lease_id
+        self.outcome = None  # None = no signal (e.g. connection error), "ok", "throttled"
+        self.retry_after = None
+
+    def succeeded(self):
+        self.outcome = "ok"
+
+    def throttled(self, retry_after=None):
+        self.outcome = "throttled"
+        self.retry_after = retry_after
+
+    def observe(self, status_code, retry_after=None):
+        """Classify an HTTP response: 429/503 shrink the window, other non-5xx grow it."""
+        if status_code in (429, 503):
+            self.throttled(parse_retry_after(retry_after))
+            logger.info(f"{self.name} throttled (HTTP {status_code}, Retry-After={retry_after})")
+        elif status_code < 500:
+            self.succeeded()
+
+
+def _wait_time(wait):
+    left = remaining()  # raises DeadlineExceeded once the job is out of time
+    return wait if left is None else min(wait, left)
+
+
+@contextlib.contextmanager
+def acquire(name, lease_seconds=None):
+    """Block until `name` has a token and a free slot in its window, then hold the slot."""
+    if not RATE_LIMIT_ENABLED:
+        yield Permit(name, None)
+        return
+    lease_seconds = lease_seconds or RATE_LIMIT_LEASE_SECONDS
+    while True:
+        lease_id, wait = _try_acquire(name, lease_seconds)
+        if lease_id is not None:
+            break
+        time.sleep(_wait_time(wait))
+
+    permit = Permit(name, lease_id)
+    try:
+        yield permit
+    finally:
+        _release(name, lease_id, permit.outcome, permit.retry_after)
+
+
+@contextlib.asynccontextmanager
+async def acquire_async(name, lease_seconds=None):
+    """asyncio variant of acquire; store access runs off the event loop."""
+    if not RATE_LIMIT_ENABLED:
+        yield Permit(name, None)
+        return
+    lease_seconds = lease_seconds or RATE_LIMIT_LEASE_SECONDS
+    while True:
+        lease_id, wait = await asyncio.to_thread(_try_acquire, name, lease_seconds)
+        if lease_id is not None:
+            break
+        await asyncio.sleep(_wait_time(wait))
+
+    permit = Permit(name, lease_id)
+    try:
+        yield permit
+    finally:
+        await asyncio.to_thread(_release, name, lease_id, permit.outcome, permit.retry_after)
+
+
+def get_rate_limit_stats():
+    """Current bucket, AIMD window and in-flight slots per dependency, across all processes."""
+    now = time.time()
+    connection = _connect()
+    try:
+        rows = connection.execute(
+            "SELECT name, tokens, refilled_at, concurrency_window, blocked_until, granted, throttled FROM rate_limits"
+        ).fetchall()
+        in_flight = dict(connection.execute(
+            "SELECT name, COUNT(*) FROM rate_limit_leases WHERE expires_at > ? GROUP BY name", (now,)
+        ).fetchall())
+    finally:
+        connection.close()
+
+    stats = {"enabled": RATE_LIMIT_ENABLED}
+    for name, tokens, refilled_at, window, blocked_until, granted, throttled in rows:
+        rate, burst, max_window = _LIMITS.get(name, (0.0, tokens, window))
+        stats[name] = {
+            "tokens": round(min(burst, tokens + max(0.0, now - refilled_at) * rate), 2) if rate > 0 else None,
+            "rate_per_second": rate,
+            "window": round(window, 2),
+            "max_window": max_window,
+            "in_flight": in_flight.get(name, 0),
+            "blocked_for_seconds": round(max(0.0, blocked_until - now), 1),
+            "granted": granted,
+            "throttled": throttled,
+        }
+    return stats
@@ -0,0 +1,54 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from service.resilience import remaining
+
+RESEMBLE_API_BASE_URL = os.getenv("RESEMBLE_API_BASE_URL", "https://app.resemble.ai/api/v2").rstrip("/")
+RESEMBLE_CONNECT_TIMEOUT = float(os.getenv("RESEMBLE_CONNECT_TIMEOUT", "5"))
+RESEMBLE_READ_TIMEOUT = float(os.getenv("RESEMBLE_READ_TIMEOUT", "30"))
+RESEMBLE_POOL_SIZE = int(os.getenv("RESEMBLE_POOL_SIZE", "16"))  # keep-alive connections per process
+
+_lock = threading.Lock()
+_session = None
+
+
+def _auth_headers():
+    token = os.getenv("RESEMBLE_API_TOKEN")  # Get token from env
+    if not token:
+        raise RuntimeError("Missing RESEMBLE_API_TOKEN environment variable.")
+    return {"Authorization": f"Bearer {token}"}
+
+
+def api_url(path: str) -> str:
+    return f"{RESEMBLE_API_BASE_URL}/{path.lstrip('/')}"
+
+
+def default_timeout():
+    """(connect, read) timeouts; the read timeout is capped by what is left of the job deadline."""
+    return (RESEMBLE_CONNECT_TIMEOUT, remaining(RESEMBLE_READ_TIMEOUT))
+
+
+def get_session() -> requests.Session:
+    """Process-wide keep-alive session; the token is read once."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=RESEMBLE_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(_auth_headers())
+                _session = session
+    return _session
+
+
+def close_clients():
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,98 @@
+import os
+import random
+import threading
+import time
+
+from service.resilience import is_retryable, remaining
+
+# Overall deadline for one detection result
+RESEMBLE_RESULT_TIMEOUT = float(os.getenv("RESEMBLE_RESULT_TIMEOUT", "900"))
+# Fallback polling: exponential backoff with full jitter between these bounds (seconds)
+RESEMBLE_POLL_BASE_DELAY = float(os.getenv("RESEMBLE_POLL_BASE_DELAY", "5"))
+RESEMBLE_POLL_MAX_DELAY = float(os.getenv("RESEMBLE_POLL_MAX_DELAY", "60"))
+# How often a waiter checks the database for callbacks received by another process
+RESEMBLE_CALLBACK_CHECK_INTERVAL = float(os.getenv("RESEMBLE_CALLBACK_CHECK_INTERVAL", "1"))
+
+_lock = threading.Lock()
+_events = {}    # uuid -> threading.Event for waiters in this process
+_results = {}   # uuid -> metrics received in this process
+
+
+def resolve(uuid, metrics):
+    """
+    Wake a waiter in this process with metrics from /resemble-callback. Callbacks
+    are persisted by process_result_resemble.update_audio_data, which is where
+    waiters in other processes pick them up (see wait_for_metrics `stored`).
+    """
+    with _lock:
+        event = _events.get(uuid)
+        if event is not None:
+            _results[uuid] = metrics
+    if event is not None:
+        event.set()
+
+
+def _poll_delay(attempt):
+    return random.uniform(0, min(RESEMBLE_POLL_MAX_DELAY, RESEMBLE_POLL_BASE_DELAY * (2 ** attempt)))
+
+
+def wait_for_metrics(uuid, poll, timeout=None, stored=None):
+    """
+    Block until metrics for `uuid` arrive by callback, or `poll(uuid)` returns them.
+
+    Args:
+        uuid (str): Resemble detection UUID
+        poll (callable): one-shot status fetch returning metrics dict or None
+        stored (callable): metrics a callback already stored for `uuid`, possibly
+            received by another process, or None; checked every RESEMBLE_CALLBACK_CHECK_INTERVAL
+        timeout (float): overall deadline in seconds (defaults to RESEMBLE_RESULT_TIMEOUT,
+            capped by the job deadline)
+
+    Raises:
+        TimeoutError: no result before the deadline
+    """
+    timeout = remaining(timeout or RESEMBLE_RESULT_TIMEOUT)
+    deadline = time.monotonic() + timeout
+    event = threading.Event()
+    with _lock:
+        _events[uuid] = event
+        metrics = _results.pop(uuid, None)
+
+    try:
+        if metrics:
+            return metrics
+
+        attempt = 0
+        next_poll = time.monotonic() + _poll_delay(attempt)
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                raise TimeoutError(f"No Resemble result for {uuid} after {timeout:.0f}s")
+
+            if event.wait(min(RESEMBLE_CALLBACK_CHECK_INTERVAL, max(0.0, next_poll - now), deadline - now)):
+                with _lock:
+                    metrics = _results.pop(uuid, None)
+                if metrics:
+                    return metrics
+
+            if stored is not None:
+                metrics = stored(uuid)
+                if metrics:
+                    return metrics
+
+            if time.monotonic() >= next_poll:
+                try:
+                    metrics = poll(uuid)
+                except Exception as e:
+                    # An outage (or an open breaker) only skips this poll; the callback may still arrive
+                    if not is_retryable(e):
+                        raise
+                    metrics = None
+                if metrics:
+                    return metrics
+                attempt += 1
+                next_poll = time.monotonic() + _poll_delay(attempt)
+    finally:
+        with _lock:
+            _events.pop(uuid, None)
+            _results.pop(uuid, None)
@@ -1,107 +1,117 @@
+import asyncio
 import os
-import time
-import requests
+
+from service.resemble_client import api_url, default_timeout, get_session
+from service.resemble_completion import wait_for_metrics
+from service.resilience import call_with_retry
+from service.rate_limiter import acquire
+from service.metrics import timed
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 
-import logging
-import sys
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+def _detect_params(file_url: str) -> dict:
+    params = {"url": file_url}
+
+    callback_url = os.getenv("RESEMBLE_CALLBACK_URL")
+    if callback_url:
+        params["callback_url"] = callback_url
+    return params
+
 
-from opencensus.ext.azure.log_exporter import AzureLogHandler
+def _uuid_from_response(data: dict) -> str:
+    if data.get("success") and "item" in data and "uuid" in data["item"]:
+        logger.info("-------------> New UUID from Resemble AI <-----------------"+data["item"]["uuid"])
+        return data["item"]["uuid"]
+    raise ValueError(f"API call failed or UUID missing. Response: {data}")
 
-# Create logger
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
-# Always log to console (local + Azure Log Stream)
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-logger.addHandler(console_handler)
+def _metrics_from_response(data: dict):
+    if data.get("success") and "item" in data:
+        return data["item"].get("metrics") or None
+    return None
 
-# Add Azure Application Insights handler only if connection string is present
-app_insights_conn = os.getenv("APP_INSIGHTS_CONNECTION_STRING")
-if app_insights_conn:
-    azure_handler = AzureLogHandler(connection_string=app_insights_conn)
-    azure_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-    logger.addHandler(azure_handler)
 
-def analyze_audio(file_url: str) -> str:
+def analyze_audio(file_url: str, timeout=None) -> str:
     """
     Calls the Resemble AI detect API with the given file URL
     and returns the UUID from the response if successful.
     """
-    api_url = "https://app.resemble.ai/api/v2/detect"
-    token = os.getenv("RESEMBLE_API_TOKEN")  # Get token from env
-    
-    if not token:
-        raise RuntimeError("Missing RESEMBLE_API_TOKEN environment variable.")
+    def _detect():
+        with acquire("resemble") as permit:
+            response = get_session().post(
+                api_url("detect"), params=_detect_params(file_url), data={}, timeout=timeout or default_timeout()
+            )
+            permit.observe(response.status_code, response.headers.get("Retry-After"))
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        with timed("resemble_submit"):
+            return _uuid_from_response(call_with_retry("resemble", _detect))
+
+    except Exception as e:
+        raise RuntimeError(f"Error analyzing audio: {e}") from e
+
+
+async def analyze_audio_async(file_url: str, timeout=None) -> str:
+    """
+    asyncio variant of analyze_audio: the same pooled session, rate limit and retry
+    policy, run on a worker thread (to_thread carries the job context over).
+    """
+    return await asyncio.to_thread(analyze_audio, file_url, timeout)
+
 
-    headers = {
-        "Authorization": f"Bearer {token}"
+def extract_metrics(metrics: dict) -> dict:
+    """Map Resemble metrics (API item or callback payload) to our column names."""
+    return {
+        "analysis_label": metrics.get("label"),
+        "analysis_scores": metrics.get("score", []),
+        "consistency": metrics.get("consistency"),
+        "aggregated_score": metrics.get("aggregated_score")
     }
-    params = {"url": file_url}
 
-    callback_url = os.getenv("RESEMBLE_CALLBACK_URL")
-    if callback_url:
-        params["callback_url"] = callback_url
 
+def fetch_metrics(uuid: str, timeout=None):
+    """
+    One GET against the Resemble detect API (through the breaker, not retried:
+    the caller's poll loop already backs off).
+    Returns the raw metrics dict, or None if the detection is still running.
+    """
+    def _fetch():
+        with acquire("resemble") as permit:
+            response = get_session().get(api_url(f"detect/{uuid}"), timeout=timeout or default_timeout())
+            permit.observe(response.status_code, response.headers.get("Retry-After"))
+        response.raise_for_status()
+        return response.json()
 
     try:
-        response = requests.post(api_url, headers=headers, params=params, data={})
-        response.raise_for_status()
-        data = response.json()
+        data = call_with_retry("resemble", _fetch, retries=1)
+    except Exception as e:
+        raise RuntimeError(f"Error analyzing result: {e}") from e
 
-        if data.get("success") and "item" in data and "uuid" in data["item"]:
-            logger.info("-------------> New UUID from Resemble AI <-----------------"+data["item"]["uuid"])
-            return data["item"]["uuid"]
-        else:
-            raise ValueError(f"API call failed or UUID missing. Response: {data}")
+    return _metrics_from_response(data)
+
+
+async def fetch_metrics_async(uuid: str, timeout=None):
+    """asyncio variant of fetch_metrics, on the same pooled session."""
+    return await asyncio.to_thread(fetch_metrics, uuid, timeout)
 
-    except Exception as e:
-        raise RuntimeError(f"Error analyzing audio: {e}")
 
-def analyze_result(uuid: str) -> dict:
+def analyze_result(uuid: str, stored=None) -> dict:
     """
-    Polls the Resemble AI detect API with the given UUID until metrics are available.
+    Waits for the Resemble AI result for the given UUID.
+    Completes as soon as /resemble-callback delivers it (in this process, or via
+    `stored` from another); polling with jittered backoff is only a fallback,
+    bounded by RESEMBLE_RESULT_TIMEOUT and the job deadline.
     Returns analysis_label, analysis_scores, consistency, aggregated_score.
     """
-    api_url = f"https://app.resemble.ai/api/v2/detect/{uuid}"
-    token = os.getenv("RESEMBLE_API_TOKEN")  # Get token from env
-    
-    if not token:
-        raise RuntimeError("Missing RESEMBLE_API_TOKEN environment variable.")
-
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
-
-    while True:
-        try:
-            response = requests.get(api_url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get("success") and "item" in data:
-                metrics = data["item"].get("metrics", {})
-
-                if metrics:  # ✅ Got metrics, extract and return
-                    analysis_label = metrics.get("label")
-                    analysis_scores = metrics.get("score", [])
-                    consistency = metrics.get("consistency")
-                    aggregated_score = metrics.get("aggregated_score")
-
-                    return {
-                        "analysis_label": analysis_label,
-                        "analysis_scores": analysis_scores,
-                        "consistency": consistency,
-                        "aggregated_score": aggregated_score
-                    }
-
-            # If no metrics yet, wait and retry
-            time.sleep(5)
-
-        except Exception as e:
-            raise RuntimeError(f"Error analyzing result: {e}")
+    with timed("resemble_wait"):
+        metrics = wait_for_metrics(uuid, fetch_metrics, stored=stored)
+    return extract_metrics(metrics)
 # def analyze_result(uuid: str) -> dict:
 #     """
 #     Calls the Resemble AI detect API with the given UUID
@@ -0,0 +1,366 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from service.job_queue import JOB_QUEUE_DB
+
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Retries: exponential backoff with full jitter between these bounds (seconds)
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "30"))
+# Retry budget per dependency: each call earns this many retries, up to RETRY_BUDGET_MAX banked
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MAX = float(os.getenv("RETRY_BUDGET_MAX", "20"))
+# Circuit breaker: open after this many consecutive failures, try again after the cool-down
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# Whole-job deadline shared by every external call a job makes (0 = none). Transcription runs
+# at about real time, so a fixed deadline must cover the longest recording you accept.
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "0"))
+
+
+class CircuitOpenError(RuntimeError):
+    """The dependency is failing; calls are rejected until its breaker cools down."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The job ran out of time before the call could be made or retried."""
+
+
+class TransientResultError(RuntimeError):
+    """The dependency answered but the result was unusable; retried without counting as an outage."""
+
+
+# ------------------ Deadlines ------------------
+
+_deadline = contextvars.ContextVar("job_deadline", default=None)  # monotonic expiry time
+
+
+@contextlib.contextmanager
+def job_deadline(seconds=None):
+    """Bound every call made inside the block (and in functions bound with bind_job_context)."""
+    if seconds is None:
+        seconds = JOB_DEADLINE_SECONDS
+    expires_at = time.monotonic() + seconds if seconds > 0 else None
+    current = _deadline.get()
+    if current is not None and (expires_at is None or current < expires_at):
+        expires_at = current  # a nested deadline can only be tighter
+    token = _deadline.set(expires_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def bind_job_context(fn):
+    """
+    Carry the caller's job context (deadline, metric labels) into fn when it later
+    runs on another thread; executor threads do not inherit context variables.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so each call gets its own copy
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def remaining(default=None):
+    """
+    Per-call timeout: `default` capped by what is left of the job deadline.
+    Returns None if neither is set; raises DeadlineExceeded once the job is out of time.
+    """
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return default
+    left = expires_at - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Job deadline exceeded")
+    return left if default is None else min(default, left)
+
+
+# ------------------ Breakers and budgets ------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS circuit_breakers (
+    pid INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    snapshot TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (pid, name)
+);
+"""
+
+_store_initialized = False
+_init_lock = threading.Lock()
+
+
+def _connect():
+    global _store_initialized
+    connection = sqlite3.connect(JOB_QUEUE_DB, timeout=30, isolation_level=None)
+    if not _store_initialized:
+        with _init_lock:
+            if not _store_initialized:
+                connection.execute("PRAGMA journal_mode=WAL;")
+                connection.executescript(_SCHEMA)
+                _store_initialized = True
+    return connection
+
+
+class CircuitBreaker:
+    """Per-process breaker: closed -> open after repeated failures -> half-open trial -> closed."""
+
+    def __init__(self, name, failure_threshold=None, reset_seconds=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds or BREAKER_RESET_SECONDS
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self.counters = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    self.counters["rejected"] += 1
+                    raise CircuitOpenError(f"{self.name} circuit is open")
+                self._transition("half_open")
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    self.counters["rejected"] += 1
+                    raise CircuitOpenError(f"{self.name} circuit is half-open, trial call in flight")
+                self._trial_in_flight = True
+            self.counters["calls"] += 1
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state != "closed":
+                self._transition("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.counters["failures"] += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.counters["opened"] += 1
+                self.opened_at = time.monotonic()
+                self._transition("open")
+
+    def release(self):
+        """The call ended without saying anything about the dependency's health."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def _transition(self, state):
+        previous, self.state = self.state, state
+        if previous != state:
+            logger.warning(f"Circuit breaker {self.name}: {previous} -> {state}")
+            self._publish()
+
+    def snapshot(self):
+        open_for = time.monotonic() - self.opened_at if self.state == "open" else None
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "open_for_seconds": round(open_for, 1) if open_for is not None else None,
+            **self.counters,
+        }
+
+    def _publish(self):
+        # Shared so the API process can report breakers of the worker processes too
+        try:
+            connection = _connect()
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO circuit_breakers (pid, name, snapshot, updated_at) VALUES (?, ?, ?, ?)",
+                    (os.getpid(), self.name, json.dumps(self.snapshot()), time.time()),
+                )
+            finally:
+                connection.close()
+        except Exception as e:
+            logger.info(f"Could not publish breaker state for {self.name}: {e}")
+
+
+class RetryBudget:
+    """Caps retries at a fraction of calls, so an outage does not multiply traffic by the retry count."""
+
+    def __init__(self, ratio=None, max_tokens=None):
+        self.ratio = RETRY_BUDGET_RATIO if ratio is None else ratio
+        self.max_tokens = RETRY_BUDGET_MAX if max_tokens is None else max_tokens
+        self.tokens = self.max_tokens
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def record_call(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.exhausted += 1
+            return False
+
+
+_dependencies = {}
+_dependencies_lock = threading.Lock()
+
+
+def get_dependency(name):
+    """(breaker, budget) for an external dependency, created on first use."""
+    with _dependencies_lock:
+        if name not in _dependencies:
+            _dependencies[name] = (CircuitBreaker(name), RetryBudget())
+        return _dependencies[name]
+
+
+def get_resilience_stats():
+    """Breaker and retry-budget state of this process, plus what other processes last published."""
+    local = {}
+    with _dependencies_lock:
+        for name, (breaker, budget) in _dependencies.items():
+            local[name] = {**breaker.snapshot(), "retry_tokens": round(budget.tokens, 2),
+                           "retry_budget_exhausted": budget.exhausted}
+
+    processes = {}
+    try:
+        connection = _connect()
+        try:
+            rows = connection.execute("SELECT pid, name, snapshot, updated_at FROM circuit_breakers").fetchall()
+        finally:
+            connection.close()
+        for pid, name, snapshot, updated_at in rows:
+            if pid != os.getpid():
+                processes.setdefault(str(pid), {})[name] = {**json.loads(snapshot), "updated_at": updated_at}
+    except Exception as e:
+        logger.info(f"Could not read shared breaker state: {e}")
+
+    return {"pid": os.getpid(), "dependencies": local, "other_processes": processes}
+
+
+# ------------------ Retry ------------------
+
+def _status_code(exc):
+    while exc is not None:
+        status = getattr(exc, "status_code", None)
+        if status is None:
+            status = getattr(getattr(exc, "response", None), "status_code", None)
+        if isinstance(status, int):
+            return status
+        exc = exc.__cause__
+    return None
+
+
+def is_retryable(exc):
+    """Transport errors, timeouts, 429 and 5xx are retried; other client errors are not."""
+    if isinstance(exc, (CircuitOpenError, DeadlineExceeded, ValueError, FileNotFoundError)):
+        return False
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    return True
+
+
+def backoff_delay(attempt, base=None, cap=None):
+    """Full-jitter exponential backoff for the given (1-based) failed attempt."""
+    base = RETRY_BASE_DELAY if base is None else base
+    cap = RETRY_MAX_DELAY if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+def _after_failure(name, breaker, budget, exc, attempt, retries, retryable):
+    """Record a failed attempt; return the delay before the next one, or None to give up."""
+    if isinstance(exc, TransientResultError) or _status_code(exc) == 429:
+        breaker.release()  # throttling is the rate limiter's signal, not an outage
+    elif retryable(exc):
+        breaker.record_failure()
+    else:
+        breaker.release()
+        return None
+    if attempt >= retries:
+        return None
+    if not budget.try_spend():
+        logger.info(f"[{name}] retry budget exhausted, not retrying")
+        return None
+    delay = backoff_delay(attempt)
+    left = remaining()
+    if left is not None:
+        if left <= delay:
+            return None
+        delay = min(delay, left)
+    return delay
+
+
+def call_with_retry(name, func, *args, retries=None, retryable=is_retryable, **kwargs):
+    """
+    Call func through the `name` dependency's breaker and retry budget, with jittered
+    backoff between attempts and the job deadline as the overall bound.
+    """
+    retries = retries or RETRY_MAX_ATTEMPTS
+    breaker, budget = get_dependency(name)
+    budget.record_call()
+    for attempt in range(1, retries + 1):
+        remaining()  # raises once the job is out of time
+        breaker.before_call()
+        try:
+            logger.info(f"[Retry {attempt}/{retries}] Attempting {name}: {func.__name__}...")
+            result = func(*args, **kwargs)
+        except Exception as e:
+            logger.info(f"[Retry {attempt}/{retries}] {name}: {func.__name__} failed: {e}")
+            delay = _after_failure(name, breaker, budget, e, attempt, retries, retryable)
+            if delay is None:
+                raise
+            time.sleep(delay)
+        except BaseException:
+            breaker.release()  # cancelled or interrupted: no verdict on the dependency
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+async def call_with_retry_async(name, func, *args, retries=None, retryable=is_retryable, **kwargs):
+    """asyncio variant of call_with_retry; func is a coroutine function."""
+    retries = retries or RETRY_MAX_ATTEMPTS
+    breaker, budget = get_dependency(name)
+    budget.record_call()
+    for attempt in range(1, retries + 1):
+        remaining()
+        breaker.before_call()
+        try:
+            logger.info(f"[Retry {attempt}/{retries}] Attempting {name}: {func.__name__}...")
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            logger.info(f"[Retry {attempt}/{retries}] {name}: {func.__name__} failed: {e}")
+            delay = _after_failure(name, breaker, budget, e, attempt, retries, retryable)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+        except BaseException:
+            breaker.release()  # cancelled or interrupted: no verdict on the dependency
+            raise
+        else:
+            breaker.record_success()
+            return result
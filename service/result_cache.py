@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from cachetools import TTLCache
+
+from service.db_service import get_db_connection
+
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))  # results older than this are recomputed
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))  # in-memory LRU front
+
+# Bump when a pipeline change should invalidate previously cached results
+PIPELINE_VERSION = "resemble-v2"
+
+_memory = TTLCache(maxsize=RESULT_CACHE_MAX_ENTRIES, ttl=RESULT_CACHE_TTL_SECONDS)
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0}
+
+
+def pipeline_config_key():
+    """Short hash of everything that changes what the pipeline produces for the same audio."""
+    config = {
+        "version": PIPELINE_VERSION,
+        "chunk_minutes": os.getenv("AUDIO_CHUNK_MINUTES", "0"),
+        "language": "en-US",
+    }
+    # Optional modes change speaker assignment or the clips sent to Resemble; they are only
+    # part of the key when on, so results cached with every mode off keep their key
+    transcription_chunks = int(os.getenv("TRANSCRIPTION_CHUNKS", "1"))
+    if transcription_chunks > 1:
+        config["transcription_chunks"] = transcription_chunks
+        config["chunk_split"] = {
+            name: os.getenv(name) for name in ("CHUNK_SPLIT_SEARCH_SECONDS", "CHUNK_MIN_SECONDS", "SPEAKER_MATCH_THRESHOLD")
+        }
+    elif float(os.getenv("STREAMING_CLIP_SECONDS", "0")) > 0:  # chunked mode does not stream clips
+        config["streaming_clip_seconds"] = float(os.getenv("STREAMING_CLIP_SECONDS"))
+    if os.getenv("VAD_ENABLED", "false").lower() == "true":
+        config["vad"] = {name: value for name, value in sorted(os.environ.items()) if name.startswith("VAD_")}
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def lookup(content_hash):
+    """
+    Return the file_id of a completed, non-expired result for this audio + pipeline config, or None.
+    """
+    if not RESULT_CACHE_ENABLED or not content_hash:
+        return None
+
+    key = (content_hash, pipeline_config_key())
+    with _lock:
+        entry = _memory.get(key)
+    if entry and entry[1] > time.time():
+        _count("hits")
+        return entry[0]
+
+    # analyzed_at is when the pipeline ran; linked copies keep it, so re-uploads don't extend the TTL
+    query = """
+        SELECT file_id, MIN(analyzed_at)
+        FROM audio_data
+        WHERE content_hash = %s
+          AND pipeline_config = %s
+          AND analyzed_at >= NOW() - make_interval(secs => %s)
+        GROUP BY file_id
+        HAVING bool_and(analysis_label IS NOT NULL)
+        ORDER BY MIN(analyzed_at) DESC
+        LIMIT 1;
+    """
+    with get_db_connection() as (cur, conn):
+        cur.execute(query, (content_hash, key[1], RESULT_CACHE_TTL_SECONDS))
+        row = cur.fetchone()
+
+    if not row:
+        _count("misses")
+        return None
+
+    file_id = str(row[0])
+    with _lock:
+        _memory[key] = (file_id, row[1].timestamp() + RESULT_CACHE_TTL_SECONDS)
+    _count("hits")
+    return file_id
+
+
+def remember(content_hash, file_id):
+    """Record a freshly completed result so the next identical upload hits memory."""
+    if not RESULT_CACHE_ENABLED or not content_hash:
+        return
+    with _lock:
+        _memory[(content_hash, pipeline_config_key())] = (file_id, time.time() + RESULT_CACHE_TTL_SECONDS)
+    _count("stores")
+
+
+def link_cached_result(source_file_id, file_name, file_id):
+    """
+    Copy the rows of a cached result under a new file_name/file_id so the
+    upload can be fetched through /get-results like any other. created_at is
+    the new upload's; analyzed_at stays that of the original analysis.
+    Returns the linked rows as dicts.
+    """
+    query = """
+        INSERT INTO audio_data (
+            speaker_name, file_url, file_uuid,
+            transcriptions, file_name, file_id, original_file_url,
+            analysis_label, analysis_scores, consistency, aggregated_score,
+            content_hash, pipeline_config, analyzed_at
+        )
+        SELECT
+            speaker_name, file_url, file_uuid,
+            transcriptions, %s, %s, original_file_url,
+            analysis_label, analysis_scores, consistency, aggregated_score,
+            content_hash, pipeline_config, analyzed_at
+        FROM audio_data
+        WHERE file_id = %s
+        RETURNING speaker_name, transcriptions, original_file_url,
+                  analysis_label, analysis_scores, consistency, aggregated_score;
+    """
+    with get_db_connection() as (cur, conn):
+        cur.execute(query, (file_name, file_id, source_file_id))
+        rows = cur.fetchall()
+        colnames = [desc[0] for desc in cur.description]
+        conn.commit()
+    logger.info(f"♻️ Linked {len(rows)} cached rows from {source_file_id} to {file_id}")
+    return [dict(zip(colnames, row)) for row in rows]
+
+
+def get_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_entries"] = len(_memory)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    stats["ttl_seconds"] = RESULT_CACHE_TTL_SECONDS
+    return stats
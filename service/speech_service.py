@@ -1,38 +1,35 @@
+import asyncio
 import os
 import tempfile
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from collections import defaultdict
 import uuid
 
 import azure.cognitiveservices.speech as speechsdk
 from pydub import AudioSegment
 
+from service.audio_clips import build_speaker_track, pcm_frames, rescale_spans, seconds_to_frame
+from service.chunked_transcription import sdk_transcriber_factory, transcribe_in_chunks
+from service.pcm_stream import SPEECH_SAMPLE_RATE, FfmpegPcmStream, probe_duration
+from service.vad import VAD_ENABLED, strip_silence
+from service.resilience import (
+    TransientResultError, bind_job_context, call_with_retry, call_with_retry_async, remaining
+)
+from service.rate_limiter import ThrottledError, acquire, acquire_async
+from service.metrics import duration_bucket, observe, timed, update_job_labels
+from service.job_queue import enter_stage
+
 import io
 from azure.storage.blob import BlobServiceClient, ContentSettings
 import mimetypes
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 
-import logging
-import sys
-
-from opencensus.ext.azure.log_exporter import AzureLogHandler
-
-# Create logger
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# Always log to console (local + Azure Log Stream)
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-logger.addHandler(console_handler)
+from service.logging_config import get_logger, sampled
 
-# Add Azure Application Insights handler only if connection string is present
-app_insights_conn = os.getenv("APP_INSIGHTS_CONNECTION_STRING")
-if app_insights_conn:
-    azure_handler = AzureLogHandler(connection_string=app_insights_conn)
-    azure_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
-    logger.addHandler(azure_handler)
+logger = get_logger(__name__)
 
 # def convert_mp3_to_pcm_tempfile(mp3_path):
 #     if not os.path.exists(mp3_path):
@@ -51,22 +48,32 @@ if app_insights_conn:
 #     audio.export(temp_wav_path, format="wav")
 #     return temp_wav_path
 
-def convert_audio_to_pcm_tempfile(input_path):
+def decode_audio(input_path):
+    """
+    Decode the upload once with ffmpeg into an in-memory PCM AudioSegment.
+    Every later stage (Speech SDK input, clip slicing) works from this buffer.
+    """
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"File not found: {input_path}")
-    
-    logger.info("Conversion Process Started!! for file: " + input_path)
 
-    # Detect extension and load accordingly
     ext = os.path.splitext(input_path)[1].lower()
-    if ext == ".mp3":
-        audio = AudioSegment.from_mp3(input_path)
-    elif ext == ".m4a":
-        audio = AudioSegment.from_file(input_path, format="m4a")
-    else:
+    if ext not in (".mp3", ".m4a", ".wav"):
         raise ValueError("Unsupported file format. Only MP3, M4A, and WAV are supported.")
 
-    # Convert to mono, 16kHz PCM WAV
+    logger.info("Decoding audio file: " + input_path)
+    start = time.perf_counter()
+    audio = AudioSegment.from_file(input_path, format=ext.lstrip("."))
+    logger.info(f"Decoded {input_path} in {time.perf_counter() - start:.2f}s ({len(audio) / 1000:.1f}s of audio)")
+    return audio
+
+
+def convert_audio_to_pcm_tempfile(input_path, audio=None):
+    if audio is None:
+        audio = decode_audio(input_path)
+
+    logger.info("Conversion Process Started!! for file: " + input_path)
+
+    # Convert to mono, 16kHz PCM WAV (in-memory resample, no second ffmpeg decode)
     audio = audio.set_channels(1)
     audio = audio.set_frame_rate(16000)
 
@@ -74,6 +81,7 @@ def convert_audio_to_pcm_tempfile(input_path):
     temp_wav_path = temp_wav_file.name
     temp_wav_file.close()
 
+    # pydub writes plain WAV itself, without spawning ffmpeg
     audio.export(temp_wav_path, format="wav")
     logger.info(f"Conversion completed. Temporary WAV file created at: {temp_wav_path}")
     return temp_wav_path
@@ -321,19 +329,6 @@ def convert_audio_to_pcm_tempfile(input_path):
 #         logger.info(f"Fatal error in recognize_from_file: {e}")
 #         raise
 
-# 🔹 Retry helper
-def retry_operation(func, retries=5, *args, **kwargs):
-    last_exception = None
-    for attempt in range(1, retries + 1):
-        try:
-            logger.info(f"[Retry {attempt}/{retries}] Attempting {func.__name__}...")
-            return func(*args, **kwargs)
-        except Exception as e:
-            logger.info(f"[Retry {attempt}/{retries}] {func.__name__} failed: {e}")
-            last_exception = e
-    raise last_exception
-
-
 # # 🔹 File upload wrapped for retry
 # def upload_blob_with_retry(container_client, blob_name, data, overwrite=True):
 #     def _upload():
@@ -343,11 +338,83 @@ def retry_operation(func, retries=5, *args, **kwargs):
 #     return retry_operation(_upload, retries=5)
 
 
+# 🔹 Blob Storage: one long-lived client per process, parallel block uploads
+BLOB_MAX_CONCURRENCY = int(os.getenv("BLOB_MAX_CONCURRENCY", "4"))  # parallel blocks per blob
+BLOB_CLIP_UPLOAD_CONCURRENCY = int(os.getenv("BLOB_CLIP_UPLOAD_CONCURRENCY", "4"))  # speaker clips at once
+BLOB_MAX_BLOCK_SIZE = int(os.getenv("BLOB_MAX_BLOCK_SIZE", str(4 * 1024 * 1024)))
+BLOB_MAX_SINGLE_PUT_SIZE = int(os.getenv("BLOB_MAX_SINGLE_PUT_SIZE", str(8 * 1024 * 1024)))
+BLOB_UPLOAD_TIMEOUT = int(os.getenv("BLOB_UPLOAD_TIMEOUT", "300"))  # per upload attempt, seconds
+
+# Longest a single transcription session may run before it is stopped and retried.
+# 0 = derived from the audio: Speech runs at about real time, so FACTOR x duration + SLACK
+SPEECH_SESSION_TIMEOUT = float(os.getenv("SPEECH_SESSION_TIMEOUT", "0"))
+SPEECH_SESSION_TIMEOUT_FACTOR = float(os.getenv("SPEECH_SESSION_TIMEOUT_FACTOR", "2"))
+SPEECH_SESSION_TIMEOUT_SLACK = float(os.getenv("SPEECH_SESSION_TIMEOUT_SLACK", "600"))
+
+# Chunked mode: transcribe this many silence-split chunks of a file concurrently (1 = off)
+TRANSCRIPTION_CHUNKS = int(os.getenv("TRANSCRIPTION_CHUNKS", "1"))
+
+# Streaming mode: export/upload a speaker's clip once they have this many seconds of audio (0 = off)
+STREAMING_CLIP_SECONDS = float(os.getenv("STREAMING_CLIP_SECONDS", "0"))
+
+# Speech SDK input: "file" writes a 16 kHz WAV first, "stream" pipes ffmpeg output straight into the SDK.
+# Stream starts transcribing at once but still decodes the file in full for clip export, so it
+# costs a second decode (~35-65% more CPU, see benchmarks/bench_speech_input.py); file stays the default.
+SPEECH_INPUT_MODE = os.getenv("SPEECH_INPUT_MODE", "file").lower()
+
+_blob_service_client = None
+_blob_client_lock = threading.Lock()
+
+
+def get_container_client(container_name):
+    """Container client on the shared BlobServiceClient (works against Azurite too)."""
+    global _blob_service_client
+    if _blob_service_client is None:
+        with _blob_client_lock:
+            if _blob_service_client is None:
+                _blob_service_client = BlobServiceClient.from_connection_string(
+                    os.getenv("AZURE_STORAGE_CONNECTION_STRING"),
+                    max_block_size=BLOB_MAX_BLOCK_SIZE,
+                    max_single_put_size=BLOB_MAX_SINGLE_PUT_SIZE,
+                )
+    return _blob_service_client.get_container_client(container_name)
+
+
+def _data_length(data):
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, io.BytesIO):
+        return data.getbuffer().nbytes
+    try:
+        return os.fstat(data.fileno()).st_size
+    except Exception:
+        return None
+
+
 # 🔹 File upload wrapped for retry
+def _busy_seconds(intervals):
+    """Wall time covered by (start, end) intervals that may overlap."""
+    busy, covered_until = 0.0, None
+    for start, end in sorted(intervals):
+        if covered_until is None or start > covered_until:
+            busy += end - start
+            covered_until = end
+        elif end > covered_until:
+            busy += end - covered_until
+            covered_until = end
+    return busy
+
+
 def upload_blob_with_retry(container_client, blob_name, data, overwrite=True):
+    length = _data_length(data)
+    start_position = data.tell() if hasattr(data, "seek") else None
+
     def _upload():
         blob_client = container_client.get_blob_client(blob_name)
         logger.info(f"Uploading blob: {blob_name}")
+        if start_position is not None:
+            data.seek(start_position)  # a failed attempt may have consumed the stream
+        started = time.perf_counter()
         # Detect MIME type from filename extension (fallback to audio/mpeg)
         content_type, _ = mimetypes.guess_type(blob_name)
         if not content_type:
@@ -355,23 +422,37 @@ def upload_blob_with_retry(container_client, blob_name, data, overwrite=True):
 
         blob_client.upload_blob(
             data,
+            length=length,
             overwrite=overwrite,
+            max_concurrency=BLOB_MAX_CONCURRENCY,
+            timeout=max(1, int(remaining(BLOB_UPLOAD_TIMEOUT))),
             content_settings=ContentSettings(
                 content_type=content_type,
                 cache_control="public, max-age=3600"  # allow browsers/CDNs to cache for 1 hour
             )
         )
-        logger.info(f"Upload completed: {blob_name}")
+        elapsed = time.perf_counter() - started
+        if length:
+            logger.info(f"Upload completed: {blob_name} ({length / 1e6:.2f} MB in {elapsed:.2f}s, "
+                        f"{length / 1e6 / max(elapsed, 1e-6):.2f} MB/s)")
+        else:
+            logger.info(f"Upload completed: {blob_name}")
         return blob_client.url
 
-    return retry_operation(_upload, retries=5)
+    with timed("blob_upload"):
+        return call_with_retry("blob", _upload)
 
 # 🔹 Transcription wrapped for retry
-def run_transcription_with_retry(conversation_transcriber, original_audio, speaker_clips, transcriptions):
-    transcribing_stop = False
+def _connect_transcriber(conversation_transcriber, original_audio, speaker_clips, transcriptions,
+                         on_utterance, signal_done, time_map=None, errors=None):
+    """
+    Hook up the SDK callbacks once; signal_done() is called when a session ends.
+    time_map: set when the SDK hears silence-stripped audio; offsets are mapped back to the original.
+    errors: list that collects (error code, details) of sessions canceled by a service error.
+    """
 
     def conversation_transcriber_transcribed_cb(evt):
-        logger.info("Transcription event received.")
+        logger.debug("Transcription event received.")
         try:
             if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech:
                 speaker = evt.result.speaker_id or "Unknown"
@@ -379,68 +460,260 @@ def run_transcription_with_retry(conversation_transcriber, original_audio, speak
                 start_time = evt.result.offset / 10_000_000
                 end_time = (evt.result.offset + evt.result.duration) / 10_000_000
 
-                clip = original_audio[start_time * 1000:end_time * 1000]
-                speaker_clips[speaker].append(clip)
+                pieces = [(start_time, end_time)]
+                if time_map is not None:
+                    pieces = time_map.original_spans(start_time, end_time)
+                    start_time, end_time = pieces[0][0], pieces[-1][1]
+
+                # Keep only sample offsets; audio is copied once per speaker later
+                spans = [(seconds_to_frame(original_audio, a), seconds_to_frame(original_audio, b)) for a, b in pieces]
+                speaker_clips[speaker].extend(spans)
                 transcriptions.append((speaker, text, start_time, end_time))
-                logger.info(f"Buffered clip for {speaker}: '{text}' ({start_time}-{end_time})")
+                if sampled("utterance"):
+                    logger.info(f"Buffered clip for {speaker}: '{text}' ({start_time}-{end_time})")
+                if on_utterance is not None:
+                    on_utterance(speaker, (spans[0][0], spans[-1][1]))
         except Exception as e:
             logger.info(f"Error in transcription callback: {e}")
             raise
 
     def stop_cb(evt):
-        nonlocal transcribing_stop
         reason = getattr(evt, "reason", None)
         error = getattr(evt, "error_details", None)
         logger.info(f"Transcription session stopped. Event={evt}, reason={reason}, error={error}")
-        transcribing_stop = True
+        signal_done()
 
     def canceled_cb(evt):
-        nonlocal transcribing_stop        
         reason = getattr(evt, "reason", None)
         error = getattr(evt, "error_details", None)
         logger.error(f"Transcription canceled. Event={evt}, reason={reason}, error={error}")
-        transcribing_stop = True
+        if errors is not None and reason == speechsdk.CancellationReason.Error:
+            errors.append((getattr(getattr(evt, "cancellation_details", None), "code", None), error))
+        signal_done()
 
     conversation_transcriber.transcribed.connect(conversation_transcriber_transcribed_cb)
     conversation_transcriber.session_stopped.connect(stop_cb)
     # conversation_transcriber.canceled.connect(stop_cb)
     conversation_transcriber.canceled.connect(canceled_cb)
 
-    def _transcribe():
-        nonlocal transcribing_stop
-        transcribing_stop = False
 
-        conversation_transcriber.start_transcribing_async()
-        while not transcribing_stop:
-            time.sleep(0.5)
-        conversation_transcriber.stop_transcribing_async()
+def _throttled(errors):
+    return bool(errors) and errors[-1][0] == speechsdk.CancellationErrorCode.TooManyRequests
+
+
+def _report_session(permit, errors):
+    if _throttled(errors):
+        permit.throttled()
+    elif not errors:
+        permit.succeeded()
+
+
+def _check_session(transcriptions, errors, allow_empty=False):
+    if _throttled(errors):
+        raise ThrottledError(f"Transcription throttled: {errors[-1][1]}")
+    if errors:
+        raise RuntimeError(f"Transcription canceled: {errors[-1][1]}")
+    if not transcriptions and not allow_empty:  # nothing captured
+        raise TransientResultError("No transcription results, retrying...")
 
-        if not transcriptions:  # nothing captured
-            raise RuntimeError("No transcription results, retrying...")
 
+def session_timeout(audio_seconds=None):
+    """Bound for one transcription session: SPEECH_SESSION_TIMEOUT, else scaled to the audio, else none."""
+    if SPEECH_SESSION_TIMEOUT > 0:
+        return SPEECH_SESSION_TIMEOUT
+    if audio_seconds:
+        return SPEECH_SESSION_TIMEOUT_FACTOR * audio_seconds + SPEECH_SESSION_TIMEOUT_SLACK
+    return None
+
+
+def _transcription_attempt(conversation_transcriber, original_audio, speaker_clips, transcriptions,
+                           on_utterance=None, time_map=None, audio_seconds=None, on_attempt=None):
+    """
+    Connect the callbacks and return a function running one session, bounded by
+    session_timeout(audio_seconds) and the job deadline.
+    on_attempt(): called before every session, so callers can reset their own state.
+    """
+    if audio_seconds is None:
+        audio_seconds = getattr(original_audio, "duration_seconds", None)
+    transcribing_done = threading.Event()
+    errors = []
+    _connect_transcriber(
+        conversation_transcriber, original_audio, speaker_clips, transcriptions, on_utterance,
+        transcribing_done.set, time_map=time_map, errors=errors
+    )
+
+    def _transcribe():
+        # Every attempt starts from clean state
+        transcribing_done.clear()
+        speaker_clips.clear()
+        transcriptions.clear()
+        errors.clear()
+        if on_attempt is not None:
+            on_attempt()
+
+        # One slot in the shared Speech concurrency window for the whole session
+        timeout = remaining(session_timeout(audio_seconds))
+        with acquire("speech", lease_seconds=timeout) as permit:
+            conversation_transcriber.start_transcribing_async().get()
+            finished = transcribing_done.wait(timeout)
+            conversation_transcriber.stop_transcribing_async().get()
+            _report_session(permit, errors)
+
+        if not finished:
+            raise TimeoutError(f"Transcription session did not finish within {timeout:.0f}s")
+        _check_session(transcriptions, errors)
         return True
 
-    return retry_operation(_transcribe, retries=5)
+    return _transcribe
+
+
+def run_transcription_with_retry(conversation_transcriber, original_audio, speaker_clips, transcriptions,
+                                 on_utterance=None, retries=5, time_map=None, on_attempt=None):
+    _transcribe = _transcription_attempt(
+        conversation_transcriber, original_audio, speaker_clips, transcriptions, on_utterance, time_map,
+        on_attempt=on_attempt
+    )
+    return call_with_retry("speech", _transcribe, retries=retries)
+
+
+async def run_transcription_async(conversation_transcriber, original_audio, speaker_clips, transcriptions,
+                                  on_utterance=None, retries=5, allow_empty=False):
+    """
+    Awaitable version of run_transcription_with_retry: no thread waits on the
+    session, so many transcribers can run concurrently from one event loop.
+    allow_empty: a session that recognizes nothing succeeds instead of being retried.
+    """
+    loop = asyncio.get_running_loop()
+    attempt_future = None
+
+    def _signal_done():
+        future = attempt_future
+        if future is not None:
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+
+    errors = []
+    _connect_transcriber(
+        conversation_transcriber, original_audio, speaker_clips, transcriptions, on_utterance, _signal_done,
+        errors=errors
+    )
+
+    async def _transcribe_async():
+        nonlocal attempt_future
+        try:
+            attempt_future = loop.create_future()
+            speaker_clips.clear()
+            transcriptions.clear()
+            errors.clear()
+
+            timeout = remaining(session_timeout(getattr(original_audio, "duration_seconds", None)))
+            async with acquire_async("speech", lease_seconds=timeout) as permit:
+                await loop.run_in_executor(None, lambda: conversation_transcriber.start_transcribing_async().get())
+                try:
+                    await asyncio.wait_for(attempt_future, timeout)
+                finally:
+                    await loop.run_in_executor(None, lambda: conversation_transcriber.stop_transcribing_async().get())
+                _report_session(permit, errors)
+
+            _check_session(transcriptions, errors, allow_empty=allow_empty)
+            return True
+        finally:
+            attempt_future = None
+
+    return await call_with_retry_async("speech", _transcribe_async, retries=retries)
+
+
+def _run_coroutine(coroutine):
+    """asyncio.run, also when called from a thread that is already running an event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcription-loop") as executor:
+        return executor.submit(bind_job_context(asyncio.run), coroutine).result()
 
 
 # 🔹 Main function
-def recognize_from_file(file_path, container_name="bc-test-samples-segregated", folder_name="savedbycode"):
+def _load_audio(file_path):
     try:
-        # Initialize Blob Service Client
-        blob_service_client = BlobServiceClient.from_connection_string(
-            os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        )
-        container_client = blob_service_client.get_container_client(container_name)
+        return decode_audio(file_path)
+    except (FileNotFoundError, ValueError):
+        raise
+    except Exception as e:
+        logger.info(f"Error loading audio file: {e}")
+        raise RuntimeError(f"Failed to load audio file: error: {e}")
+
+
+def recognize_from_file(file_path, container_name="bc-test-samples-segregated", folder_name="savedbycode",
+                        on_clip_uploaded=None, stream_clip_seconds=None, transcription_chunks=None,
+                        transcriber_factory=None, speech_input_mode=None):
+    """
+    Transcribe + diarize a file and upload one clip per speaker.
+
+    on_clip_uploaded(speaker, url): called as soon as each speaker clip is uploaded,
+        so detection can start while transcription is still running.
+    stream_clip_seconds: streaming mode (defaults to STREAMING_CLIP_SECONDS; 0 = off).
+        A speaker's clip is exported and uploaded as soon as they have this much audio,
+        instead of after the whole file is transcribed.
+    transcription_chunks: split the audio at silences into this many chunks and
+        transcribe them concurrently (defaults to TRANSCRIPTION_CHUNKS; 1 = off).
+    transcriber_factory: chunk AudioSegment -> (transcriber, cleanup), for chunked mode.
+        Defaults to Azure ConversationTranscriber; a fake can be plugged in for testing.
+    speech_input_mode: "file" or "stream" (defaults to SPEECH_INPUT_MODE). In stream mode
+        the SDK reads 16 kHz PCM from an ffmpeg pipe, so transcription starts on the first
+        decoded frames, and the full-quality decode for clips runs alongside it.
+        Not used with chunked mode, which already transcribes from memory.
+    Long silences are stripped before transcription when VAD_ENABLED is set (file input
+    only); stored offsets and clip spans still refer to the original file.
+    """
+    if stream_clip_seconds is None:
+        stream_clip_seconds = STREAMING_CLIP_SECONDS
+    if transcription_chunks is None:
+        transcription_chunks = TRANSCRIPTION_CHUNKS
+    if speech_input_mode is None:
+        speech_input_mode = SPEECH_INPUT_MODE
+    if transcription_chunks > 1:
+        speech_input_mode = "file"
+    stream_input = speech_input_mode == "stream"
+    clip_executor = None
+    original_upload = None
+    try:
+        # Shared Blob Service Client
+        container_client = get_container_client(container_name)
+        uploaded_bytes = 0
+        upload_intervals = []  # (start, end) of every blob upload; they run concurrently
 
         chunk_minutes = int(os.getenv("AUDIO_CHUNK_MINUTES", "0"))
         logger.info(f"Audio chunk minutes set to: {chunk_minutes}")
         chunk_ms = chunk_minutes * 60 * 1000  # Convert to ms (pydub works in ms)
 
         # ✅ Upload original file with retry
-        with open(file_path, "rb") as data:
-            original_blob_name = f"{folder_name}/{os.path.basename(file_path)}"
-            original_file = upload_blob_with_retry(container_client, original_blob_name, data)
-            logger.info(f"Uploaded original file: {original_file}")
+        stage_timings = {}
+        job_started = time.perf_counter()
+
+        def _stage_done(stage, started):
+            """Record the stage's offsets for the timing log line and its duration for /metrics."""
+            ended = time.perf_counter()
+            stage_timings[stage] = (started - job_started, ended - job_started)
+            observe(stage, ended - started)
+
+        # ✅ Upload original file with retry, in the background; only its URL is needed, at the end
+        original_blob_name = f"{folder_name}/{os.path.basename(file_path)}"
+
+        @bind_job_context
+        def _upload_original():
+            started = time.perf_counter()
+            with open(file_path, "rb") as data:
+                url = upload_blob_with_retry(container_client, original_blob_name, data)
+            ended = time.perf_counter()
+            upload_intervals.append((started, ended))
+            stage_timings["original_upload"] = (started - job_started, ended - job_started)
+            logger.info(f"Uploaded original file: {url}")
+            return url
+
+        original_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="original-upload")
+        original_upload = original_executor.submit(_upload_original)
+        original_executor.shutdown(wait=False)
+        original_file = original_blob_name  # for log lines until the upload finishes
 
         # Configure Azure Speech
         speech_config = speechsdk.SpeechConfig(
@@ -453,61 +726,221 @@ def recognize_from_file(file_path, container_name="bc-test-samples-segregated",
             value="true"
         )
 
-        # Handle file extension
         ext = file_path.lower().split(".")[-1]
-        if ext in ["mp3", "m4a"]:
-            wav_path = convert_audio_to_pcm_tempfile(file_path)
-        elif ext == "wav":
-            wav_path = file_path
+        wav_path = file_path
+        audio_config = None
+        conversation_transcriber = None
+        speech_audio = None  # 16 kHz mono audio the SDK hears, when it differs from the file
+        vad_map = None
+        stage_started = time.perf_counter()
+        if stream_input:
+            if VAD_ENABLED:
+                logger.info("VAD is not applied to stream input; the SDK reads the pipe as decoded")
+            # Clips are cut from the full-quality decode, which runs while the SDK reads the pipe.
+            # That is a second decode of the file (the pipe is 16 kHz mono): more CPU for an earlier start.
+            @bind_job_context
+            def _decode_for_clips():
+                audio = _load_audio(file_path)
+                update_job_labels(duration_bucket=duration_bucket(audio.duration_seconds))
+                _stage_done("decode", stage_started)
+                return audio
+
+            decode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="decode")
+            decoded = decode_executor.submit(_decode_for_clips)
+            decode_executor.shutdown(wait=False)
+            original_audio = None
+            timebase_rate = SPEECH_SAMPLE_RATE  # spans are counted in pipe frames until the decode is in
         else:
-            raise ValueError("Unsupported file format. Only MP3, M4A, and WAV are supported.")
-
-        audio_config = speechsdk.audio.AudioConfig(filename=wav_path)
-        conversation_transcriber = speechsdk.transcription.ConversationTranscriber(
-            speech_config=speech_config,
-            audio_config=audio_config
-        )
-
-        # Load original audio
-        try:
-            original_audio = AudioSegment.from_file(file_path)
-        except Exception as e:
-            logger.info(f"Error loading audio file: {e}")
-            raise RuntimeError(f"Failed to load audio file: error: {e}")
-
-        speaker_clips = defaultdict(list)
+            # Decode once; the same PCM buffer feeds the Speech SDK and clip slicing
+            original_audio = _load_audio(file_path)
+            update_job_labels(duration_bucket=duration_bucket(original_audio.duration_seconds))
+            decoded = Future()
+            decoded.set_result(original_audio)
+            timebase_rate = original_audio.frame_rate
+
+            if VAD_ENABLED:
+                vad_started = time.perf_counter()
+                speech_audio, vad_map = strip_silence(
+                    original_audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
+                )
+                _stage_done("vad", vad_started)
+
+            # Handle file extension (chunked mode feeds each chunk separately, no whole-file WAV)
+            if transcription_chunks <= 1 and (vad_map is not None or ext in ["mp3", "m4a"]):
+                wav_path = convert_audio_to_pcm_tempfile(file_path, audio=speech_audio if speech_audio is not None else original_audio)
+            _stage_done("decode", stage_started)
+
+            if transcription_chunks <= 1:
+                audio_config = speechsdk.audio.AudioConfig(filename=wav_path)
+                conversation_transcriber = speechsdk.transcription.ConversationTranscriber(
+                    speech_config=speech_config,
+                    audio_config=audio_config
+                )
+
+        speaker_clips = defaultdict(list)  # speaker -> [(start_frame, end_frame)] at timebase_rate
         transcriptions = []
         uploaded_files = {}
 
-        # ✅ Run transcription with retry
-        logger.info(f"Starting transcription with retry for file {original_file}...")
-        run_transcription_with_retry(conversation_transcriber, original_audio, speaker_clips, transcriptions)
-        logger.info(f"Transcription completed for file {original_file}.")
-
-        # ✅ Upload speaker clips with retry
-        for speaker, clips in speaker_clips.items():
-            if speaker == "Unknown":
-                logger.info("Skipping export for speaker: Unknown")
-                continue
-            if clips:
-                logger.info(f"combining {len(clips)} clips for speaker: {speaker} for file {original_file}")
-                combined = sum(clips)
+        # ✅ Export + upload speaker clips concurrently, with retry
+        @bind_job_context
+        def _export_and_upload(speaker, clips, attempt=None):
+            logger.info(f"combining {len(clips)} clips for speaker: {speaker} for file {original_file}")
+            audio = decoded.result()
+            clips = rescale_spans(clips, timebase_rate, audio.frame_rate)
+            with timed("clip_export"):
                 # If chunk_ms > 0, trim audio, otherwise keep full
-                if chunk_ms > 0:
-                    combined = combined[:chunk_ms]
+                combined = build_speaker_track(audio, clips, max_ms=chunk_ms, frames=pcm_frames(audio))
                 buffer = io.BytesIO()
                 combined.export(buffer, format="mp3")
                 buffer.seek(0)
 
-                blob_name = f"{folder_name}/{str(uuid.uuid4())}{speaker}.mp3"
-                blob_url = upload_blob_with_retry(container_client, blob_name, buffer)
-                uploaded_files[speaker] = blob_url
-                logger.info(f"Uploaded clip for {original_file}-{speaker}: {blob_url}")
+            blob_name = f"{folder_name}/{str(uuid.uuid4())}{speaker}.mp3"
+            started = time.perf_counter()
+            blob_url = upload_blob_with_retry(container_client, blob_name, buffer)
+            upload_intervals.append((started, time.perf_counter()))
+            with clip_lock:
+                # A clip streamed from an abandoned session may name a different speaker now
+                current = not job_failed and (attempt is None or attempt == transcription_attempt)
+            if on_clip_uploaded is not None and current:
+                on_clip_uploaded(speaker, blob_url)
+            return blob_url, buffer.getbuffer().nbytes
+
+        clip_executor = ThreadPoolExecutor(max_workers=max(1, BLOB_CLIP_UPLOAD_CONCURRENCY), thread_name_prefix="clip-upload")
+        clip_futures = {}  # speaker -> future of (url, bytes)
+        clip_lock = threading.Lock()
+        stream_frames = int(stream_clip_seconds * timebase_rate) if stream_clip_seconds else 0
+        transcription_attempt = 0
+        job_failed = False
+
+        def _start_attempt():
+            # Speaker IDs are per session, so clips streamed by an earlier attempt are discarded
+            nonlocal transcription_attempt
+            with clip_lock:
+                transcription_attempt += 1
+                if clip_futures:
+                    logger.info(f"Transcription retry for {original_file}: discarding "
+                                f"{len(clip_futures)} streamed clip(s)")
+                    for future in clip_futures.values():
+                        future.cancel()
+                    clip_futures.clear()
+
+        # Runs on Speech SDK callback threads, which do not inherit the job's metric labels
+        @bind_job_context
+        def _on_utterance(speaker, span):
+            if "first_utterance" not in stage_timings:
+                first_utterance = time.perf_counter() - job_started
+                stage_timings["first_utterance"] = (first_utterance, first_utterance)
+                observe("first_utterance", first_utterance)
+                logger.info(f"Time to first utterance for {original_file}: {first_utterance:.2f}s "
+                            f"({speech_input_mode} input)")
+            # Streaming mode: ship a speaker's clip as soon as they have enough audio
+            if not stream_frames or speaker == "Unknown":
+                return
+            with clip_lock:
+                if job_failed or speaker in clip_futures:
+                    return
+                speaker_frames = sum(end - start for start, end in speaker_clips[speaker])
+                if speaker_frames < stream_frames:
+                    return
+                logger.info(f"Streaming clip for {speaker} after {speaker_frames / timebase_rate:.1f}s of audio")
+                clip_futures[speaker] = clip_executor.submit(
+                    _export_and_upload, speaker, list(speaker_clips[speaker]), transcription_attempt
+                )
+
+        # ✅ Run transcription with retry
+        logger.info(f"Starting transcription with retry for file {original_file}...")
+        stage_started = time.perf_counter()
+        if transcription_chunks > 1:
+            if stream_frames:
+                logger.info("Streaming mode is not used with chunked transcription; clips upload after stitching")
+            if speech_audio is None:
+                speech_audio = original_audio.set_channels(1).set_frame_rate(16000).set_sample_width(2)
+            chunked_transcriptions, chunked_clips = _run_coroutine(transcribe_in_chunks(
+                speech_audio, original_audio, transcription_chunks,
+                transcriber_factory or sdk_transcriber_factory(speech_config),
+                run_transcription_async
+            ))
+            if not chunked_transcriptions:
+                raise RuntimeError("No transcription results in any chunk")
+            if vad_map is not None:
+                chunked_transcriptions, chunked_clips = vad_map.remap(
+                    chunked_transcriptions, lambda t: seconds_to_frame(original_audio, t)
+                )
+            transcriptions.extend(chunked_transcriptions)
+            speaker_clips.update(chunked_clips)
+        elif stream_input:
+            audio_seconds = probe_duration(file_path)
+
+            def _transcribe_from_pipe():
+                # A pipe can only be read once, so every attempt gets its own ffmpeg + transcriber
+                pcm_stream = FfmpegPcmStream(file_path)
+                transcriber = speechsdk.transcription.ConversationTranscriber(
+                    speech_config=speech_config,
+                    audio_config=pcm_stream.audio_config()
+                )
+                try:
+                    _transcription_attempt(
+                        transcriber, pcm_stream, speaker_clips, transcriptions, on_utterance=_on_utterance,
+                        audio_seconds=audio_seconds, on_attempt=_start_attempt
+                    )()
+                except Exception:
+                    pcm_stream.finish(check=False)
+                    raise
+                pcm_stream.finish()
+                return True
+
+            call_with_retry("speech", _transcribe_from_pipe)
+        else:
+            run_transcription_with_retry(
+                conversation_transcriber, original_audio, speaker_clips, transcriptions,
+                on_utterance=_on_utterance, time_map=vad_map, on_attempt=_start_attempt
+            )
+        _stage_done("transcription", stage_started)
+        logger.info(f"Transcription completed for file {original_file}.")
+        if vad_map is not None:
+            # Transcription time scales with the audio sent, so the removed share is an estimate of time saved
+            transcription_seconds = stage_timings["transcription"][1] - stage_timings["transcription"][0]
+            saved = vad_map.removed_seconds * transcription_seconds / max(vad_map.kept_seconds, 1e-6)
+            logger.info(f"VAD for {original_file}: speech ratio {vad_map.speech_ratio:.1%}, "
+                        f"sent {vad_map.kept_seconds:.1f}s of {vad_map.original_seconds:.1f}s to Speech, "
+                        f"~{saved:.1f}s transcription time saved")
+        if stream_input:
+            decoded.result()  # surface decode errors even if no clip needed it yet
+
+        enter_stage("clip_upload")
+        if "Unknown" in speaker_clips:
+            logger.info("Skipping export for speaker: Unknown")
+        stage_started = time.perf_counter()
+        with clip_lock:
+            for speaker, clips in speaker_clips.items():
+                if speaker != "Unknown" and clips and speaker not in clip_futures:
+                    clip_futures[speaker] = clip_executor.submit(_export_and_upload, speaker, clips)
+        for speaker, future in clip_futures.items():
+            uploaded_files[speaker], clip_bytes = future.result()
+            uploaded_bytes += clip_bytes
+        stage_timings["clip_upload"] = (stage_started - job_started, time.perf_counter() - job_started)
+
+        # Join the original upload before anything is written to the DB
+        stage_started = time.perf_counter()
+        original_file = original_upload.result()
+        stage_timings["original_upload_join_wait"] = (stage_started - job_started, time.perf_counter() - job_started)
+        uploaded_bytes += os.path.getsize(file_path)
+        # Wall time with at least one upload in flight, not the sum of overlapping uploads
+        upload_seconds = _busy_seconds(upload_intervals)
+
+        # Per-stage (start, end) offsets in seconds from job start; overlapping ranges ran concurrently
+        logger.info("Stage timings for " + original_file + ": " + ", ".join(
+            f"{stage}={start:.2f}-{end:.2f}s" for stage, (start, end) in stage_timings.items()
+        ))
+
+        if upload_seconds > 0:
+            logger.info(f"Blob upload for {original_file}: {uploaded_bytes / 1e6:.2f} MB in {upload_seconds:.2f}s "
+                        f"({uploaded_bytes / 1e6 / upload_seconds:.2f} MB/s)")
 
         # Cleanup
         audio_config = None
         conversation_transcriber = None
-        if file_path.lower().endswith(".mp3") and os.path.exists(wav_path):
+        if wav_path != file_path and os.path.exists(wav_path):
             try:
                 os.remove(wav_path)
             except Exception as e:
@@ -517,7 +950,18 @@ def recognize_from_file(file_path, container_name="bc-test-samples-segregated",
 
     except Exception as e:
         logger.info(f"Fatal error in recognize_from_file: {e}")
+        if clip_executor is not None:
+            # No new clips once the job has failed; queued ones are dropped
+            with clip_lock:
+                job_failed = True
+            clip_executor.shutdown(wait=False, cancel_futures=True)
         raise
+    finally:
+        if clip_executor is not None:
+            clip_executor.shutdown(wait=False)
+        # A failed job must not leave the original upload running behind it
+        if original_upload is not None and not original_upload.cancel():
+            wait([original_upload])
 
 
 # ------------------ Run Example ------------------
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from service.metrics import file_format, observe
+
+UPLOAD_ROOT = os.getenv("UPLOAD_ROOT", tempfile.gettempdir())
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))  # 1 MB
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))  # 1 GB
+
+JOB_WORKSPACE_PREFIX = "job_"
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+async def save_upload(file):
+    """
+    Stream an UploadFile in chunks into its own per-job workspace directory.
+    Hashes (sha256) and counts bytes while writing, and enforces MAX_UPLOAD_BYTES.
+    Disk writes run in the threadpool so the event loop is never blocked.
+
+    Returns:
+        dict with path, workspace, file_name, sha256 and size
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise UploadTooLargeError(f"{file.filename} exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+
+    os.makedirs(UPLOAD_ROOT, exist_ok=True)
+    workspace = await run_in_threadpool(tempfile.mkdtemp, prefix=JOB_WORKSPACE_PREFIX, dir=UPLOAD_ROOT)
+    safe_filename = os.path.basename(file.filename or "upload").replace(" ", "_")   # replace spaces
+    path = os.path.join(workspace, safe_filename)
+
+    hasher = hashlib.sha256()
+    size = 0
+    started = time.perf_counter()
+    try:
+        out = await run_in_threadpool(open, path, "wb")
+        try:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadTooLargeError(f"{file.filename} exceeds the {MAX_UPLOAD_BYTES} byte upload limit")
+                hasher.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+        finally:
+            await run_in_threadpool(out.close)
+    except BaseException:
+        await run_in_threadpool(shutil.rmtree, workspace, True)
+        raise
+    observe("upload_in", time.perf_counter() - started, format=file_format(safe_filename))
+
+    return {
+        "path": path,
+        "workspace": workspace,
+        "file_name": safe_filename,
+        "sha256": hasher.hexdigest(),
+        "size": size,
+    }
+
+
+def remove_workspace(file_path):
+    """Delete an uploaded file together with its per-job workspace directory."""
+    workspace = os.path.dirname(file_path)
+    if os.path.basename(workspace).startswith(JOB_WORKSPACE_PREFIX):
+        shutil.rmtree(workspace, ignore_errors=True)
+    elif os.path.exists(file_path):
+        os.remove(file_path)
@@ -0,0 +1,121 @@
+import os
+from collections import defaultdict
+
+import numpy as np
+
+from service.audio_clips import frame_energy, pcm_samples
+
+from service.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+# Strip long silences before transcription (off by default)
+VAD_ENABLED = os.getenv("VAD_ENABLED", "false").lower() == "true"
+# A frame is speech if louder than both the file's noise floor + margin and the absolute floor
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "10"))
+VAD_FLOOR_DBFS = float(os.getenv("VAD_FLOOR_DBFS", "-45"))
+VAD_NOISE_PERCENTILE = float(os.getenv("VAD_NOISE_PERCENTILE", "10"))
+# Only non-speech runs at least this long are cut; this much is kept on each side of a cut
+VAD_MIN_SILENCE_SECONDS = float(os.getenv("VAD_MIN_SILENCE_SECONDS", "1.0"))
+VAD_KEEP_SILENCE_SECONDS = float(os.getenv("VAD_KEEP_SILENCE_SECONDS", "0.25"))
+
+_FRAME_MS = 30
+_INT16_FULL_SCALE_DB = 20 * np.log10(32768)
+
+
+def speech_regions(samples, sample_rate, frame_ms=_FRAME_MS):
+    """
+    (start_sample, end_sample) regions to keep, with every non-speech run of at least
+    VAD_MIN_SILENCE_SECONDS cut down to VAD_KEEP_SILENCE_SECONDS of padding per side.
+
+    Returns (regions, speech_ratio). Energy-based: silence and line noise are removed,
+    loud hold music is mostly kept.
+    """
+    energy, frame_len = frame_energy(samples, sample_rate, frame_ms)
+    if not len(energy):
+        return [(0, len(samples))], 1.0
+
+    energy_dbfs = energy - _INT16_FULL_SCALE_DB
+    threshold = max(np.percentile(energy_dbfs, VAD_NOISE_PERCENTILE) + VAD_MARGIN_DB, VAD_FLOOR_DBFS)
+    voiced = energy_dbfs > threshold
+    speech_ratio = float(voiced.mean())
+    if not voiced.any():
+        return [(0, len(samples))], speech_ratio
+
+    # Non-speech runs as [start, end) frame indices
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], (~voiced).astype(np.int8), [0]))))
+    run_starts, run_ends = edges[::2], edges[1::2]
+    min_frames = int(np.ceil(VAD_MIN_SILENCE_SECONDS * 1000 / frame_ms))
+    keep_frames = int(round(VAD_KEEP_SILENCE_SECONDS * 1000 / frame_ms))
+    long_runs = (run_ends - run_starts) >= max(min_frames, 2 * keep_frames + 1)
+    cut_starts = (run_starts[long_runs] + keep_frames) * frame_len
+    cut_ends = np.minimum((run_ends[long_runs] - keep_frames) * frame_len, len(samples))
+
+    # Kept regions are the gaps between cuts
+    starts = np.concatenate(([0], cut_ends))
+    ends = np.concatenate((cut_starts, [len(samples)]))
+    regions = [(int(s), int(e)) for s, e in zip(starts, ends) if e > s]
+    return regions, speech_ratio
+
+
+class TimeMap:
+    """Maps times in the silence-stripped audio back to the original file."""
+
+    def __init__(self, regions, sample_rate, total_samples, speech_ratio=1.0):
+        lengths = np.array([end - start for start, end in regions], dtype=np.float64) / sample_rate
+        self.in_starts = np.array([start for start, _ in regions], dtype=np.float64) / sample_rate
+        self.out_starts = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+        self.lengths = lengths
+        self.original_seconds = total_samples / sample_rate
+        self.kept_seconds = float(lengths.sum())
+        self.speech_ratio = speech_ratio
+
+    @property
+    def removed_seconds(self):
+        return self.original_seconds - self.kept_seconds
+
+    def to_original(self, seconds):
+        i = max(0, int(np.searchsorted(self.out_starts, seconds, side="right")) - 1)
+        return float(self.in_starts[i] + min(max(seconds - self.out_starts[i], 0.0), self.lengths[i]))
+
+    def original_spans(self, start, end):
+        """Original-time (start, end) pieces of a stripped-time interval, skipping the removed parts."""
+        first = max(0, int(np.searchsorted(self.out_starts, start, side="right")) - 1)
+        last = max(first, int(np.searchsorted(self.out_starts, end, side="left")) - 1)
+        pieces = []
+        for i in range(first, last + 1):
+            lo = max(start, self.out_starts[i]) - self.out_starts[i]
+            hi = min(end, self.out_starts[i] + self.lengths[i]) - self.out_starts[i]
+            if hi > lo:
+                pieces.append((float(self.in_starts[i] + lo), float(self.in_starts[i] + hi)))
+        return pieces or [(self.to_original(start), self.to_original(end))]
+
+    def remap(self, transcriptions, to_frame):
+        """
+        Rebuild (transcriptions, speaker_clips) from stripped-time transcriptions:
+        start/end point at the original file, clip spans skip the removed silence.
+        """
+        remapped = []
+        speaker_clips = defaultdict(list)
+        for speaker, text, start, end in transcriptions:
+            pieces = self.original_spans(start, end)
+            remapped.append((speaker, text, pieces[0][0], pieces[-1][1]))
+            speaker_clips[speaker].extend((to_frame(a), to_frame(b)) for a, b in pieces)
+        return remapped, speaker_clips
+
+
+def strip_silence(speech_audio):
+    """
+    Drop long non-speech spans from 16-bit mono audio.
+    Returns (stripped AudioSegment, TimeMap back to the original timeline).
+    """
+    samples = pcm_samples(speech_audio)
+    regions, speech_ratio = speech_regions(samples, speech_audio.frame_rate)
+    time_map = TimeMap(regions, speech_audio.frame_rate, len(samples), speech_ratio)
+
+    raw = np.frombuffer(speech_audio.raw_data, dtype=np.int16)
+    stripped = speech_audio._spawn(np.concatenate([raw[start:end] for start, end in regions]).tobytes())
+    logger.info(f"VAD: speech ratio {speech_ratio:.1%}, keeping {time_map.kept_seconds:.1f}s of "
+                f"{time_map.original_seconds:.1f}s in {len(regions)} regions")
+    return stripped, time_map
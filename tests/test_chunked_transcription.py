@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+np = pytest.importorskip("numpy")
+AudioSegment = pytest.importorskip("pydub").AudioSegment
+pytest.importorskip("azure.cognitiveservices.speech")
+
+from service import chunked_transcription  # noqa: E402
+from service.chunked_transcription import find_split_points, transcribe_in_chunks  # noqa: E402
+
+SAMPLE_RATE = 16000
+TURN_SECONDS = 5
+VOICES = {"A": 140.0, "B": 310.0}
+
+
+def _turn(voice):
+    """One 5 s turn of a harmonic "voice" followed by a short pause."""
+    t = np.arange(TURN_SECONDS * SAMPLE_RATE) / SAMPLE_RATE
+    wave = sum(np.sin(2 * np.pi * VOICES[voice] * k * t) / k for k in range(1, 8))
+    return 0.3 * wave * (t < TURN_SECONDS - 0.8)
+
+
+def _recording(turns, seed=0):
+    """turns: "A", "B" or None (5 s of silence) per 5 s slot."""
+    rng = np.random.default_rng(seed)
+    pieces = [_turn(v) if v else np.zeros(TURN_SECONDS * SAMPLE_RATE) for v in turns]
+    samples = np.concatenate(pieces)
+    samples = ((samples + 0.005 * rng.standard_normal(len(samples))) * 12000).astype(np.int16)
+    return AudioSegment(samples.tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1)
+
+
+def _voice(samples):
+    spectrum = np.abs(np.fft.rfft(samples))
+    peak = np.argmax(spectrum) * SAMPLE_RATE / len(samples)
+    return min(VOICES, key=lambda v: abs(VOICES[v] - peak))
+
+
+class FakeRunner:
+    """
+    Stands in for run_transcription_async: one utterance per voiced run, named
+    differently in alternate chunks so only the stitcher can link speakers.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, transcriber, chunk_audio, speaker_clips, transcriptions, allow_empty=False):
+        chunk = len(self.calls)
+        self.calls.append(allow_empty)
+        samples = np.frombuffer(chunk_audio.raw_data, dtype=np.int16).astype(np.float32)
+        frame = SAMPLE_RATE // 100
+        n_frames = len(samples) // frame
+        rms = np.sqrt(np.mean(samples[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+        voiced = np.append(rms > 1000, False)
+
+        start = None
+        for i, is_voiced in enumerate(voiced):
+            if is_voiced and start is None:
+                start = i
+            elif not is_voiced and start is not None:
+                if i - start >= 50:
+                    voice = _voice(samples[start * frame:i * frame])
+                    local = "Guest-1" if (voice == "A") != (chunk % 2 == 1) else "Guest-2"
+                    transcriptions.append((local, voice, start / 100, i / 100))
+                start = None
+        if not transcriptions and not allow_empty:
+            raise RuntimeError("No transcription results")
+
+
+def _run(audio, n_chunks, runner):
+    return asyncio.run(transcribe_in_chunks(audio, audio, n_chunks, lambda chunk: (None, lambda: None), runner))
+
+
+def test_short_audio_is_not_split_into_tiny_chunks():
+    samples = np.random.default_rng(0).standard_normal(9 * SAMPLE_RATE).astype(np.float32)
+
+    assert find_split_points(samples, SAMPLE_RATE, 4) == [0, len(samples)]
+
+    points = find_split_points(samples, SAMPLE_RATE, 4, min_chunk_seconds=1)
+    lengths = np.diff(points)
+    assert len(points) == 5
+    assert all(lengths >= len(samples) / 4 / 2 - SAMPLE_RATE * 0.03)
+
+
+def test_cuts_land_in_silence_near_the_even_split():
+    audio = _recording(["A", "B"] * 6)
+    samples = np.frombuffer(audio.raw_data, dtype=np.int16).astype(np.float32)
+
+    points = find_split_points(samples, SAMPLE_RATE, 3, search_seconds=3, min_chunk_seconds=5)
+
+    assert points[0] == 0 and points[-1] == len(samples)
+    assert points == sorted(set(points))
+    for point in points[1:-1]:
+        assert (point / SAMPLE_RATE) % TURN_SECONDS >= TURN_SECONDS - 0.8  # inside a pause
+
+
+def test_stitched_speakers_are_consistent_across_chunks(monkeypatch):
+    monkeypatch.setattr(chunked_transcription, "CHUNK_MIN_SECONDS", 5)
+    turns = ["A", "B"] * 6
+    runner = FakeRunner()
+
+    transcriptions, speaker_clips = _run(_recording(turns), 3, runner)
+
+    assert len(runner.calls) == 3
+    assert len(transcriptions) == len(turns)
+    assert [t[2] for t in transcriptions] == sorted(t[2] for t in transcriptions)
+    speakers_by_voice = {}
+    for speaker, voice, start, end in transcriptions:
+        assert turns[int(round(start / TURN_SECONDS))] == voice
+        assert start == pytest.approx(round(start / TURN_SECONDS) * TURN_SECONDS, abs=0.05)
+        speakers_by_voice.setdefault(voice, set()).add(speaker)
+    assert all(len(speakers) == 1 for speakers in speakers_by_voice.values())
+    assert speakers_by_voice["A"] != speakers_by_voice["B"]
+    assert sum(len(spans) for spans in speaker_clips.values()) == len(turns)
+
+
+def test_silent_chunk_is_an_empty_result(monkeypatch):
+    monkeypatch.setattr(chunked_transcription, "CHUNK_MIN_SECONDS", 5)
+    turns = ["A", "B", "A", "B"] + [None] * 8 + ["A", "B", "A", "B"]
+    runner = FakeRunner()
+
+    transcriptions, _ = _run(_recording(turns), 3, runner)
+
+    assert runner.calls == [True, True, True]
+    assert [voice for _, voice, _, _ in transcriptions] == [t for t in turns if t]
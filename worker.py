@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import traceback
+
+from dotenv import load_dotenv, find_dotenv
+from service.logging_config import get_logger
+load_dotenv(find_dotenv())
+
+from service import job_queue
+from service.metrics import JOBS, inc, job_metrics
+from service.process_audio_resemble import process_audio
+from service.profiling import profile_job
+from service.upload_service import remove_workspace
+
+logger = get_logger(__name__)
+
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "2"))  # worker processes
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))  # seconds between polls of an empty queue
+
+
+def _heartbeat(lease, stop):
+    while not stop.wait(job_queue.JOB_LEASE_SECONDS / 3):
+        if not job_queue.renew_lease(lease.job_id, lease.owner):
+            logger.info(f"Lost lease on job {lease.job_id}; stopping at the next stage")
+            lease.lost.set()
+            return
+
+
+def run_job(job, owner):
+    file_path = job["file_path"]
+    stop = threading.Event()
+    with job_queue.holding(job["id"], owner) as lease:
+        heartbeat = threading.Thread(target=_heartbeat, args=(lease, stop), daemon=True)
+        heartbeat.start()
+        try:
+            with job_metrics(file_path), profile_job(f"job-{job['id']}", enabled=job["profile"]):
+                try:
+                    process_audio(file_path, content_hash=job["content_hash"])
+                except Exception:
+                    inc(JOBS, status="failed")
+                    raise
+                inc(JOBS, status="completed")
+            job_queue.complete(job["id"], owner)
+            logger.info(f"✅ Finished processing {file_path} (job {job['id']})")
+            remove_workspace(file_path)
+            logger.info(f"🗑️ Deleted temp file {file_path}")
+        except job_queue.LeaseLost:
+            # The worker that re-claimed the job owns it (and its upload) now
+            logger.info(f"Abandoned job {job['id']} after losing its lease")
+        except Exception as e:
+            logger.info(f"Job {job['id']} failed on attempt {job['attempts']}: {e}")
+            logger.info(traceback.format_exc())
+            if lease.lost.is_set():
+                logger.info(f"Job {job['id']} is owned by another worker; not recording the failure")
+            elif not job_queue.fail(job["id"], owner, e):
+                logger.info(f"Job {job['id']} gave up after {job['attempts']} attempts")
+                remove_workspace(file_path)
+        finally:
+            stop.set()
+
+
+def _discard(job):
+    logger.info(f"Job {job['id']} gave up after its lease expired on attempt {job['attempts']}")
+    remove_workspace(job["file_path"])
+
+
+def worker_loop():
+    owner = job_queue.worker_id()
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+    logger.info(f"Job worker {owner} started")
+
+    while not stopping.is_set():
+        try:
+            job = job_queue.claim(owner, discard=_discard)
+        except Exception as e:
+            logger.info(f"Failed to claim job: {e}")
+            job = None
+        if job is None:
+            stopping.wait(JOB_POLL_INTERVAL)
+            continue
+        run_job(job, owner)
+
+    logger.info(f"Job worker {owner} stopped")
+
+
+def start_workers(concurrency=None):
+    """Spawn worker processes; returns them so the caller can stop them."""
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for _ in range(concurrency or JOB_WORKER_CONCURRENCY):
+        process = context.Process(target=worker_loop, daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def stop_workers(processes, timeout=30):
+    # SIGTERM lets a worker finish its current job; unfinished leases are picked up after restart
+    for process in processes:
+        process.terminate()
+    deadline = time.monotonic() + timeout
+    for process in processes:
+        process.join(max(0, deadline - time.monotonic()))
+
+
+if __name__ == "__main__":
+    workers = start_workers()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        stop_workers(workers)